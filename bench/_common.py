@@ -0,0 +1,122 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+Shared helpers for the benchmark scripts
+Results are appended to bench/results/<name>.jsonl, one run per line;
+a run can be promoted to bench/results/<name>.baseline.json and later runs
+are compared against it (or against the previous run if there is no baseline)
+"""
+import os
+import json
+import math
+import time
+import platform
+import subprocess
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Metrics where a larger value is an improvement, everything else is a cost
+HIGHER_IS_BETTER = ("rps", "throughput")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile, 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR), check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def save_result(name: str, metrics: Dict[str, Dict[str, float]], params: dict,
+                results_dir: str = RESULTS_DIR) -> dict:
+    """Append a run to the result history and return it"""
+    os.makedirs(results_dir, exist_ok=True)
+    run = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "params": params,
+        "metrics": metrics,
+    }
+    with open(os.path.join(results_dir, f"{name}.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+
+def load_reference(name: str, results_dir: str = RESULTS_DIR) -> Optional[dict]:
+    """Baseline run if one was promoted, else the last stored run"""
+    baseline_path = os.path.join(results_dir, f"{name}.baseline.json")
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    history_path = os.path.join(results_dir, f"{name}.jsonl")
+    if not os.path.exists(history_path):
+        return None
+    last = None
+    with open(history_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def save_baseline(name: str, run: dict, results_dir: str = RESULTS_DIR) -> None:
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, f"{name}.baseline.json"), "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+
+
+def compare(metrics: Dict[str, Dict[str, float]], reference: Optional[dict],
+            tolerance: float = 0.2) -> List[str]:
+    """
+    Return a description of every metric that got worse by more than tolerance
+    Runs with different params are still compared, the caller prints both
+    """
+    if not reference:
+        return []
+    regressions = []
+    for scenario, values in metrics.items():
+        old_values = reference.get("metrics", {}).get(scenario, {})
+        for metric, value in values.items():
+            old = old_values.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or old <= 0:
+                continue
+            if metric.startswith(HIGHER_IS_BETTER):
+                change = (old - value) / old
+            else:
+                change = (value - old) / old
+            if change > tolerance:
+                regressions.append(f"{scenario}.{metric}: {old:.4g} -> {value:.4g} ({change:+.0%} worse)")
+    return regressions
+
+
+def report(name: str, metrics: Dict[str, Dict[str, float]], params: dict,
+           tolerance: float = 0.2, promote: bool = False) -> int:
+    """
+    Print, store and compare a run
+    Returns the process exit code: 1 if a regression was found
+    """
+    reference = load_reference(name)
+    for scenario, values in metrics.items():
+        formatted = ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in values.items())
+        print(f"{scenario}: {formatted}")
+    run = save_result(name, metrics, params)
+    if promote:
+        save_baseline(name, run)
+        print(f"Stored as baseline for {name}")
+    regressions = compare(metrics, reference, tolerance)
+    if reference:
+        print(f"Compared with run of {reference['timestamp']} ({reference.get('revision', 'unknown')})")
+    for regression in regressions:
+        print(f"[REGRESSION] {regression}")
+    return 1 if regressions else 0
@@ -0,0 +1,15 @@
+#!/usr/bin/env bash
+# Offline stand-in for steamcmd.sh: checks the workshop.vdf, waits, and exits
+# FAKE_STEAMCMD_DELAY: seconds to wait (default: 1), FAKE_STEAMCMD_EXIT: exit code (default: 0)
+if [ "$1" != "+workshop_build_item" ] || [ ! -f "$2" ]; then
+    echo "fake steamcmd: usage: steamcmd.sh +workshop_build_item <vdf> +quit" >&2
+    exit 2
+fi
+content_folder=$(grep -oP '"contentfolder"\s*"\K[^"]+' "$2")
+if [ ! -d "$content_folder" ]; then
+    echo "fake steamcmd: content folder $content_folder does not exist" >&2
+    exit 2
+fi
+echo "fake steamcmd: uploading $(find "$content_folder" -type f | wc -l) files from $content_folder"
+sleep "${FAKE_STEAMCMD_DELAY:-1}"
+exit "${FAKE_STEAMCMD_EXIT:-0}"
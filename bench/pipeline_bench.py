@@ -0,0 +1,198 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+Benchmark the data pipeline on a synthetic corpus
+A fake workshop tree (mods x version folders x language CSVs) and a matching
+data repository are generated, then every stage is timed and its peak memory
+measured: load_raw, load_old, merge, update_data, save_data, reorder, convert
+Usage: python -m bench.pipeline_bench [--mods 100] [--keys 300] [--versions 2] [--languages 4]
+"""
+import os
+import csv
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+from typing import Callable, Dict, List
+import toml
+
+from bench._common import report
+from util.mod_target import ModTarget
+from util.reorder import reorder_toml_sections
+from util.helper import search_versions, search_file, search_language_files
+import convert_toml_to_csv
+
+LANGUAGES = ["zhCN", "zhTW", "ruRU", "jaJP", "frFR", "deDE", "plPL", "ptBR", "koKR", "esES"]
+WORDS = ["Metal", "Stairs", "Water", "Pump", "Beaver", "District", "Storage", "Power", "Wheel", "Path",
+         "Bridge", "Levee", "Farm", "House", "Lumber", "Mill", "Gear", "Dam", "Tank", "{0}", "<b>", "</b>"]
+
+
+def _text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+
+
+def _write_csv(path: str, rows: List[tuple]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Text", "Comment"])
+        writer.writerows(rows)
+
+
+def generate_corpus(root: str, mods: int, keys: int, versions: int, languages: int, seed: int = 0) -> dict:
+    """
+    Create root/workshop/<mod id>/version-0.x/Localizations/*.csv and root/data/<mod id>.toml
+    Newer versions drop some keys and reword others, the data repository holds the
+    previous run: mostly unchanged sources with translations plus a few old-only keys
+    """
+    rng = random.Random(seed)
+    workshop = os.path.join(root, "workshop")
+    data = os.path.join(root, "data")
+    os.makedirs(data)
+    langs = LANGUAGES[:languages]
+    version_names = [f"version-0.{5 + i}" for i in range(versions)]
+    mod_ids = [str(3000000000 + i) for i in range(mods)]
+    for mod_id in mod_ids:
+        mod_path = os.path.join(workshop, mod_id)
+        os.makedirs(mod_path)
+        with open(os.path.join(mod_path, "workshop_data.json"), "w", encoding="utf-8") as f:
+            f.write(f'{{"Name": "Bench Mod {mod_id}"}}')
+        texts = OrderedDict((f"Bench.{mod_id}.Key{k}", _text(rng)) for k in range(keys))
+        for version in version_names:
+            # Every newer version rewords 5% and drops 2% of the keys
+            for key in list(texts):
+                roll = rng.random()
+                if roll < 0.02 and len(texts) > 1:
+                    del texts[key]
+                elif roll < 0.07:
+                    texts[key] = _text(rng)
+            loc = os.path.join(mod_path, version, "Localizations")
+            _write_csv(os.path.join(loc, "enUS.csv"), [(key, text, "-") for key, text in texts.items()])
+            for lang in langs:
+                _write_csv(os.path.join(loc, f"{lang}.csv"),
+                           [(key, f"[{lang}] {text}", "-") for key, text in texts.items() if rng.random() < 0.3])
+
+        old = OrderedDict()
+        old["_meta"] = OrderedDict([("name", f"Bench Mod {mod_id}")])
+        for key, text in texts.items():
+            entry = OrderedDict()
+            entry["raw"] = text if rng.random() > 0.1 else _text(rng)
+            for lang in langs:
+                if rng.random() < 0.8:
+                    entry[lang] = f"[{lang}] {entry['raw']}"
+            old[key] = entry
+        for k in range(max(1, keys // 20)):
+            old[f"Bench.{mod_id}.Removed{k}"] = OrderedDict([("raw", _text(rng)), (langs[0] if langs else "zhCN", "x")])
+        with open(os.path.join(data, f"{mod_id}.toml"), "w", encoding="utf-8") as f:
+            f.write(reorder_toml_sections(toml.dumps(old)))
+    return {"workshop": workshop, "data": data, "mod_ids": mod_ids, "languages": langs}
+
+
+class StageTimer:
+    """Accumulate time per stage, optionally tracing the peak memory of each stage"""
+
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory = trace_memory
+        self.seconds: Dict[str, float] = {}
+        self.peaks: Dict[str, int] = {}
+
+    def run(self, stage: str, func: Callable, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func(*args)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            self.peaks[stage] = max(self.peaks.get(stage, 0), peak)
+        return result
+
+
+def run_pipeline(corpus: dict, work_dir: str, timer: StageTimer, jobs: int) -> None:
+    """Run every stage over all mods of the corpus, the same way main.py does"""
+    out_data = os.path.join(work_dir, "data")
+    convert_in = os.path.join(work_dir, "convert_in")
+    convert_out = os.path.join(work_dir, "mod")
+    os.makedirs(convert_in)
+    seed_languages = corpus["languages"]
+
+    def load_raw(mod_id: str) -> ModTarget:
+        mod_path = os.path.join(corpus["workshop"], mod_id)
+        versions = search_versions(mod_path)
+        target = ModTarget(mod_id, f"Bench Mod {mod_id}", mod_path, seed_languages)
+        for version, raw_path in search_file(mod_path, versions, keyword="en").items():
+            target.add_version(version, raw_path)
+        for version, language_files in search_language_files(mod_path, versions).items():
+            target.add_seed_files(version, language_files)
+        return target
+
+    targets = [timer.run("load_raw", load_raw, mod_id) for mod_id in corpus["mod_ids"]]
+    for target in targets:
+        timer.run("load_old", target.load_old_data, corpus["data"])
+        merged = timer.run("merge", target._merge_old_version_data)
+        latest = target.versions[target.version_priority[0]]
+        latest.old_data = merged
+        timer.run("update_data", latest.update_data)
+        timer.run("save_data", latest.save_data, out_data, target.mod_id)
+
+    texts = []
+    for target in targets:
+        with open(os.path.join(out_data, f"{target.mod_id}.toml"), "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    timer.run("reorder", lambda: [reorder_toml_sections(text) for text in texts])
+
+    # The converter reads the cloud workflow layout <mod id>_version-<version>.toml
+    for target in targets:
+        shutil.copy(os.path.join(out_data, f"{target.mod_id}.toml"),
+                    os.path.join(convert_in, f"{target.mod_id}_{target.version_priority[0]}.toml"))
+    timer.run("convert", convert_toml_to_csv.convert_toml_to_csv, convert_in, convert_out, jobs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the data pipeline stages on a synthetic corpus")
+    parser.add_argument("--mods", type=int, default=100, help="Mods in the corpus (default: 100)")
+    parser.add_argument("--keys", type=int, default=300, help="Keys per mod (default: 300)")
+    parser.add_argument("--versions", type=int, default=2, help="Version folders per mod (default: 2)")
+    parser.add_argument("--languages", type=int, default=4, help="Shipped languages besides enUS (default: 4)")
+    parser.add_argument("--jobs", type=int, default=1, help="Converter worker processes (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass for peak memory")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default: 0.2)")
+    parser.add_argument("--baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        corpus = generate_corpus(os.path.join(root, "corpus"), args.mods, args.keys, args.versions,
+                                 args.languages, args.seed)
+        print(f"Generated {args.mods} mods in {time.perf_counter() - start:.1f}s")
+
+        # Timings come from an untraced pass, tracemalloc slows allocation-heavy code down
+        timer = StageTimer(trace_memory=False)
+        run_pipeline(corpus, os.path.join(root, "timed"), timer, args.jobs)
+        memory = StageTimer(trace_memory=True)
+        if not args.no_memory:
+            tracemalloc.start()
+            run_pipeline(corpus, os.path.join(root, "traced"), memory, args.jobs)
+            tracemalloc.stop()
+
+    total_keys = args.mods * args.keys
+    metrics = {}
+    for stage, seconds in timer.seconds.items():
+        metrics[stage] = {"seconds": seconds, "throughput_keys": total_keys / seconds if seconds else 0.0}
+        if stage in memory.peaks:
+            metrics[stage]["peak_mib"] = memory.peaks[stage] / 1024 / 1024
+    metrics["total"] = {"seconds": sum(timer.seconds.values())}
+
+    params = {k: v for k, v in vars(args).items() if k not in ("baseline", "tolerance")}
+    return report("pipeline", metrics, params, args.tolerance, args.baseline)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
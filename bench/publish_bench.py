@@ -0,0 +1,98 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+Benchmark the Releaser publish stage offline
+A throwaway base directory with a local bare `origin`, and the stand-ins in
+bench/fakes for steamcmd.sh and gh, replace Steam and GitHub
+Usage: python -m bench.publish_bench [--steam-delay 1] [--gh-delay 1] [--files 200]
+"""
+import os
+import random
+import logging
+import argparse
+import tempfile
+import subprocess
+import time
+
+from bench._common import report
+from util.release import Releaser
+
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes")
+
+
+def make_base_dir(root: str, files: int, seed: int = 0) -> str:
+    """Create git/, mod_info/ and a bare origin the release tag can be pushed to"""
+    rng = random.Random(seed)
+    git_dir = os.path.join(root, "git")
+    mod_dir = os.path.join(git_dir, "mod", "version-0.7", "Localizations")
+    os.makedirs(mod_dir)
+    for i in range(files):
+        with open(os.path.join(mod_dir, f"{i}_zhCN.csv"), "w", encoding="utf-8") as f:
+            f.write("ID,Text,Comment\n")
+            f.writelines(f"Key.{i}.{j},\"{rng.random()}\",-\n" for j in range(50))
+    with open(os.path.join(git_dir, "versions.txt"), "w", encoding="utf-8") as f:
+        f.write("version-0.7")
+
+    mod_info_dir = os.path.join(root, "mod_info")
+    os.makedirs(mod_info_dir)
+    with open(os.path.join(mod_info_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        f.write('{"Name": "Bench", "Version": "2.1.0"}\n')
+
+    origin = os.path.join(root, "origin.git")
+    run = lambda *args: subprocess.run(args, cwd=git_dir, check=True, capture_output=True)
+    subprocess.run(["git", "init", "-q", "--bare", origin], check=True)
+    run("git", "init", "-q")
+    run("git", "add", "-A")
+    run("git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "bench")
+    run("git", "remote", "add", "origin", origin)
+    return root
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent Steam and GitHub publish stage")
+    parser.add_argument("--steam-delay", type=float, default=1.0, help="Seconds the fake steamcmd takes")
+    parser.add_argument("--gh-delay", type=float, default=1.0, help="Seconds the fake gh takes")
+    parser.add_argument("--files", type=int, default=200, help="CSV files in the fake release")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default: 0.2)")
+    parser.add_argument("--baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ["FAKE_STEAMCMD_DELAY"] = str(args.steam_delay)
+    os.environ["FAKE_GH_DELAY"] = str(args.gh_delay)
+    metrics = {}
+    with tempfile.TemporaryDirectory() as root:
+        make_base_dir(root, args.files)
+        releaser = Releaser(root, "1062090", "0", "bench", "bench",
+                            steamcmd_path=os.path.join(FAKES_DIR, "steamcmd.sh"),
+                            gh_path=os.path.join(FAKES_DIR, "gh"))
+        os.makedirs(releaser.steamcmd_dir)
+        releaser.prepare_release()
+
+        # Serial: one target after the other, as before the publish stage
+        start = time.perf_counter()
+        serial = releaser.publish("2.1.1", push_github=False)
+        serial.update(releaser.publish("2.1.1", push_steam=False))
+        serial_wall = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = releaser.publish("2.1.2")
+        concurrent_wall = time.perf_counter() - start
+
+        for name, result in list(serial.items()) + list(concurrent.items()):
+            if not result["ok"]:
+                print(f"[ERROR] {name}: {result['error']}")
+                return 1
+        metrics["publish"] = {
+            "serial_wall": serial_wall,
+            "concurrent_wall": concurrent_wall,
+            "steam": concurrent["steam"]["duration"],
+            "github": concurrent["github"]["duration"],
+        }
+
+    params = {k: v for k, v in vars(args).items() if k not in ("baseline", "tolerance")}
+    return report("publish", metrics, params, args.tolerance, args.baseline)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+Benchmark the start-up cost of the command line tools
+Every scenario runs in a fresh interpreter; wall time is measured around the
+process and the import time of the entry module comes from -X importtime.
+Heavy optional dependencies that get loaded without being needed are counted
+Usage: python -m bench.startup_bench [--runs 20]
+"""
+import os
+import sys
+import argparse
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from bench._common import percentile, report
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only the network steps need, none of them should be loaded by importing an entry point
+HEAVY_MODULES = ["requests", "bs4", "deep_translator", "urllib3", "cProfile", "pstats"]
+
+# scenario: (code run with -c, module whose import time is reported)
+SCENARIOS = {
+    "python": ("pass", None),
+    "import_main": ("import main", "main"),
+    "main_help": ("import sys, runpy; sys.argv = ['main.py', '--help']; runpy.run_module('main', run_name='__main__')",
+                  None),
+    "import_converter": ("import convert_toml_to_csv", "convert_toml_to_csv"),
+}
+
+
+def import_time(stderr: str, module: str) -> float:
+    """Cumulative import time in seconds of module from -X importtime output"""
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+    return 0.0
+
+
+def heavy_modules(code: str) -> List[str]:
+    """Heavy modules present in sys.modules after running code, which may exit (argparse --help)"""
+    probe = (f"import sys, io, contextlib\n"
+             f"with contextlib.redirect_stdout(io.StringIO()):\n"
+             f"    try:\n"
+             f"        exec({code!r})\n"
+             f"    except SystemExit:\n"
+             f"        pass\n"
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", probe], cwd=REPO_DIR, capture_output=True, text=True)
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def run_scenario(code: str, module: Optional[str], runs: int) -> Dict[str, float]:
+    walls = []
+    imports = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_DIR,
+                                capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"{code!r} failed: {result.stderr.strip().splitlines()[-1]}")
+        if module:
+            imports.append(import_time(result.stderr, module))
+    metrics = {"wall_p50": percentile(walls, 50), "wall_p90": percentile(walls, 90)}
+    if module:
+        metrics["import_p50"] = percentile(imports, 50)
+    return metrics
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the start-up time of main.py and the converter")
+    parser.add_argument("--runs", type=int, default=20, help="Interpreter starts per scenario (default: 20)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default: 0.2)")
+    parser.add_argument("--baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    metrics = {}
+    heavy_loaded = False
+    for scenario, (code, module) in SCENARIOS.items():
+        metrics[scenario] = run_scenario(code, module, args.runs)
+        if code != "pass":
+            loaded = heavy_modules(code)
+            metrics[scenario]["heavy_modules"] = len(loaded)
+            if loaded:
+                heavy_loaded = True
+                print(f"[REGRESSION] {scenario} loads {', '.join(loaded)}")
+
+    # A baseline of zero heavy modules is never compared, so any heavy import fails the run itself
+    status = report("startup", metrics, {"runs": args.runs, "python": sys.version.split()[0]},
+                    args.tolerance, args.baseline)
+    return 1 if heavy_loaded else status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,200 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+Benchmark TranslatorLLM against a local OpenAI-compatible stub
+The stub answers /v1/chat/completions with configurable latency, error rate
+and 429 behaviour, so throughput can be measured without a real API
+Usage: python -m bench.translator_bench [--latency 0.05] [--requests 200] ...
+"""
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+from bench._common import percentile, report
+from util.translator import TranslatorLLM
+
+
+class MockLLMServer:
+    """
+    OpenAI-styled chat completion stub running in a background thread
+    latency: base seconds per response, jitter: extra uniform random seconds
+    error_rate: share of requests answered with HTTP 500
+    limit_per_second: requests above this in one second get HTTP 429 (0 = off)
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 limit_per_second: int = 0, seed: int = 0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limit_per_second = limit_per_second
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = 0.0
+        self.window_count = 0
+        self.status_counts: Dict[int, int] = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+
+    def _decide_status(self) -> tuple[int, float]:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.limit_per_second and self.window_count > self.limit_per_second:
+                status = 429
+            elif self.random.random() < self.error_rate:
+                status = 500
+            else:
+                status = 200
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        return status, delay
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                status, delay = stub._decide_status()
+                time.sleep(delay)
+                text = body["messages"][-1]["content"]
+                if status == 200:
+                    payload = {
+                        "choices": [{"message": {"role": "assistant", "content": f"[translated] {text}"}}],
+                        "usage": {"prompt_tokens": len(text) // 4 + 1, "completion_tokens": len(text) // 4 + 1},
+                    }
+                elif status == 429:
+                    payload = {"error": {"message": "Rate limit reached", "type": "rate_limit"}}
+                else:
+                    payload = {"error": {"message": "Internal error", "type": "server_error"}}
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "MockLLMServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def sample_texts(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = ["Metal", "Stairs", "Water", "Pump", "Beaver", "District", "Storage", "Power", "Wheel",
+             "Path", "Bridge", "Levee", "Farm", "House", "{0}", "<color=#FF0000>", "</color>"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(2, 30))) for _ in range(count)]
+
+
+def run_scenario(translator: TranslatorLLM, server: MockLLMServer, call: Callable[[str], dict],
+                 texts: List[str], concurrency: int) -> Dict[str, float]:
+    """Drive call over texts and collect throughput, latency and limiter figures"""
+    latencies: List[float] = []
+    failures = 0
+    translator.limiter_wait = 0.0
+    translator.request_history = []
+    server.status_counts = {}
+
+    def timed(text: str) -> None:
+        nonlocal failures
+        start = time.perf_counter()
+        result = call(text)
+        latencies.append(time.perf_counter() - start)
+        if not result:
+            failures += 1
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for text in texts:
+            timed(text)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, texts))
+    elapsed = time.perf_counter() - start
+    return {
+        "rps": len(texts) / elapsed if elapsed else 0.0,
+        "p50_latency": percentile(latencies, 50),
+        "p99_latency": percentile(latencies, 99),
+        "limiter_wait": translator.limiter_wait,
+        "failures": failures,
+        "http_429": server.status_counts.get(429, 0),
+        "http_500": server.status_counts.get(500, 0),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark TranslatorLLM against a local mock endpoint")
+    parser.add_argument("--requests", type=int, default=100, help="Calls per scenario (default: 100)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Stub random extra latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of HTTP 500 responses")
+    parser.add_argument("--limit-per-second", type=int, default=0, help="Stub 429 threshold per second (0 = off)")
+    parser.add_argument("--rate-limit", default="1000/m", help="Client rate limit (default: 1000/m)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers for the concurrent scenario")
+    parser.add_argument("--max-length", type=int, default=200,
+                        help="Translator max_length, longer texts are translated in parallel segments")
+    parser.add_argument("--segment-workers", type=int, default=4, help="Translator max_workers for segments")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default: 0.2)")
+    parser.add_argument("--baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    texts = sample_texts(args.requests)
+    metrics = {}
+    with MockLLMServer(args.latency, args.jitter, args.error_rate, args.limit_per_second) as server:
+        translator = TranslatorLLM(min_length=3, max_length=args.max_length, rate_limit=args.rate_limit,
+                                   llm_info={"api": server.url, "token": "bench"},
+                                   max_workers=args.segment_workers)
+
+        def translate(text: str) -> dict:
+            result = translator.translate(text, "zhCN")
+            return result if result["code"] == 200 else None
+
+        def translate_with_context(text: str) -> dict:
+            context = {"mod_name": "Bench", "key": "Bench.Key",
+                       "previous_translations": [{"version": "0.6", "raw": text, "translation": text}]}
+            translation = translator.translate_with_context(text, context, "zhCN")["translation"]
+            # The fallback to translate() returns its {"text", "code"} result instead of a string
+            if isinstance(translation, dict):
+                return translation if translation["code"] == 200 else None
+            return translation or None
+
+        metrics["translate"] = run_scenario(translator, server, translate, texts, 1)
+        metrics["translate_with_context"] = run_scenario(translator, server, translate_with_context, texts, 1)
+        metrics["translate_concurrent"] = run_scenario(translator, server, translate, texts, args.concurrency)
+        # Descriptions several times longer than max_length
+        long_texts = [". ".join(texts[i:i + 8]) + "." for i in range(0, len(texts), 8)]
+        metrics["translate_long"] = run_scenario(translator, server, translate, long_texts, 1)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("baseline", "tolerance")}
+    return report("translator", metrics, params, args.tolerance, args.baseline)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,121 +3,427 @@
 
 import os
 import re
-import toml
 import csv
 import shutil
 import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from util import toml_cache
+from util.toml_cache import load_toml
 
-def convert_toml_to_csv(data_dir, mod_dir):
-    """将TOML文件转换为CSV文件"""
-    
-    # 第一阶段：处理所有 TOML 文件（包括 default）
-    default_files = {}  # 存储 default 版本的文件信息
-
-    for file_name in os.listdir(data_dir):
-        if file_name.endswith(".toml"):
-            # 提取 mod_id 和 version
-            if "_default.toml" in file_name:
-                # 处理 default 版本
-                mod_id = file_name.replace("_default.toml", "")
-                version = "default"
-            else:
-                match = re.search(r"(\d+)_version-(.+)\.toml", file_name)
-                if not match:
-                    print(f"Skipping file {file_name}: does not match expected pattern")
+
+def parse_toml_name(file_name):
+    """从文件名提取 mod_id 和 version，不匹配时返回 None"""
+    if "_default.toml" in file_name:
+        # 处理 default 版本
+        return file_name.replace("_default.toml", ""), "default"
+    match = re.search(r"(\d+)_version-(.+)\.toml", file_name)
+    if not match:
+        return None
+    return match.groups()
+
+
+def convert_file(data_dir, mod_dir, file_name):
+    """
+    转换单个 TOML 文件，可在子进程中运行
+    不直接输出日志，而是返回消息列表由主进程按文件顺序统一输出
+    """
+    result = {
+        'file_name': file_name,
+        'mod_id': None,
+        'version': None,
+        'output_dir': None,
+        'files': [],
+        'empty': {},
+        'messages': [],
+        'error': False,
+    }
+    parsed = parse_toml_name(file_name)
+    if parsed is None:
+        result['messages'].append(f"Skipping file {file_name}: does not match expected pattern")
+        return result
+    mod_id, version = parsed
+    result['mod_id'] = mod_id
+    result['version'] = version
+
+    version_folder = f"version-{version}" if version != "default" else "default"
+    toml_path = os.path.join(data_dir, file_name)
+    output_dir = os.path.join(mod_dir, version_folder, "Localizations")
+    result['output_dir'] = output_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 读取 TOML 文件
+    try:
+        data = load_toml(toml_path)
+
+        # 收集所有语言代码 (排除 _meta 和其他元数据字段)
+        all_languages = set()
+        for key, translations in data.items():
+            # Skip _meta section
+            if key == '_meta':
+                continue
+            if isinstance(translations, dict):
+                for lang_code in translations.keys():
+                    if lang_code not in ['raw', 'new', 'status']:
+                        all_languages.add(lang_code)
+
+        # 单次遍历条目，同时写入所有语言的 CSV 文件
+        lang_codes = sorted(all_languages)
+        csv_files = {}
+        writers = {}
+        empty_counts = {lang_code: 0 for lang_code in lang_codes}
+        try:
+            for lang_code in lang_codes:
+                csv_file_name = f"{lang_code}_{mod_id}.csv"
+                csv_path = os.path.join(output_dir, csv_file_name)
+                if os.path.exists(csv_path):
+                    os.remove(csv_path)
+                csv_files[lang_code] = open(csv_path, "w", encoding="utf-8", newline="")
+                writers[lang_code] = csv.writer(csv_files[lang_code])
+                writers[lang_code].writerow(["ID", "Text", "Comment"])
+                result['files'].append((csv_file_name, csv_path))
+
+            # 遍历所有翻译条目 (跳过 _meta 和 name/field_prompt)
+            for translation_key, translations in data.items():
+                # Skip _meta section and old-style metadata
+                if translation_key in ['_meta', 'name', 'field_prompt']:
                     continue
-                mod_id, version = match.groups()
-            
-            version_folder = f"version-{version}" if version != "default" else "default"
-            toml_path = os.path.join(data_dir, file_name)
-            output_dir = os.path.join(mod_dir, version_folder, "Localizations")
-            os.makedirs(output_dir, exist_ok=True)
-
-            # 读取 TOML 文件
-            try:
-                with open(toml_path, "r", encoding="utf-8") as toml_file:
-                    data = toml.load(toml_file)
-                
-                # 收集所有语言代码 (排除 _meta 和其他元数据字段)
-                all_languages = set()
-                for key, translations in data.items():
-                    # Skip _meta section
-                    if key == '_meta':
+                if not isinstance(translations, dict):
+                    continue
+                for lang_code, translation_text in translations.items():
+                    writer = writers.get(lang_code)
+                    if writer is None:
                         continue
-                    if isinstance(translations, dict):
-                        for lang_code in translations.keys():
-                            if lang_code not in ['raw', 'new', 'status']:
-                                all_languages.add(lang_code)
-                
-                # 为每种语言生成 CSV 文件
-                generated_files = []
-                for lang_code in all_languages:
-                    csv_file_name = f"{lang_code}_{mod_id}.csv"
-                    csv_path = os.path.join(output_dir, csv_file_name)
-                    
-                    empty_entries_count = 0
-                    
-                    with open(csv_path, "w", encoding="utf-8", newline="") as csv_file:
-                        writer = csv.writer(csv_file)
-                        writer.writerow(["ID", "Text", "Comment"])
-                        
-                        # 遍历所有翻译条目 (跳过 _meta 和 name/field_prompt)
-                        for translation_key, translations in data.items():
-                            # Skip _meta section and old-style metadata
-                            if translation_key in ['_meta', 'name', 'field_prompt']:
-                                continue
-                            if isinstance(translations, dict) and lang_code in translations:
-                                translation_text = translations[lang_code]
-                                # 检查空字符串并输出警告
-                                if not translation_text or not translation_text.strip():
-                                    empty_entries_count += 1
-                                    print(f"[Warning] Empty translation for key '{translation_key}' in language '{lang_code}' (file: {file_name})")
-                                else:
-                                    writer.writerow([translation_key, translation_text, "-"])
-                    
-                    if empty_entries_count > 0:
-                        print(f"[Info] Skipped {empty_entries_count} empty entries for {lang_code} in {file_name}")
-                    
-                    generated_files.append((csv_file_name, csv_path))
-                
+                    # 空字符串只计数，最后按语言汇总输出
+                    if not translation_text or not translation_text.strip():
+                        empty_counts[lang_code] += 1
+                    else:
+                        writer.writerow([translation_key, translation_text, "-"])
+        finally:
+            for csv_file in csv_files.values():
+                csv_file.close()
+
+        result['empty'] = {lang_code: count for lang_code, count in empty_counts.items() if count > 0}
+        if result['empty']:
+            details = ", ".join(f"{lang_code}={count}" for lang_code, count in result['empty'].items())
+            result['messages'].append(
+                f"[Warning] Skipped {sum(result['empty'].values())} empty translations in {file_name}: {details}")
+
+    except Exception as e:
+        result['messages'].append(f"[ERROR] Failed to process {toml_path}: {e}")
+        result['error'] = True
+    return result
+
+
+MANIFEST_FORMAT = 1
+
+
+def file_hash(path):
+    """计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """读取转换清单，不存在或无法使用时返回 None"""
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != MANIFEST_FORMAT:
+            return None
+        return manifest
+    except Exception as e:
+        print(f"[Warning] Ignoring unreadable manifest {manifest_path}: {e}")
+        return None
+
+
+def save_manifest(manifest_path, files):
+    """原子写入转换清单"""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"format": MANIFEST_FORMAT, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def version_dir_names(mod_dir):
+    return sorted(d for d in os.listdir(mod_dir) if d.startswith("version-") and os.path.isdir(os.path.join(mod_dir, d)))
+
+
+def remove_outputs(mod_dir, rel_paths):
+    """删除清单中记录的输出文件，返回删除数量"""
+    removed = 0
+    for rel_path in rel_paths:
+        path = os.path.join(mod_dir, rel_path)
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def prune_empty_dirs(mod_dir):
+    """删除 version-* 下的空目录"""
+    for version_dir in version_dir_names(mod_dir):
+        for root, dirs, files in os.walk(os.path.join(mod_dir, version_dir), topdown=False):
+            if not os.listdir(root):
+                os.rmdir(root)
+
+
+FICLONE = 0x40049409  # Linux ioctl，btrfs/xfs 等文件系统的 reflink
+
+
+def _reflink(source_path, target_path):
+    import fcntl
+    with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def link_output(source_path, target_path, stats=None):
+    """
+    将生成的 CSV 放到目标位置：优先硬链接，其次 reflink，最后复制
+    目标文件先删除，避免写入穿透到其他硬链接
+    """
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    method = "linked"
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        try:
+            _reflink(source_path, target_path)
+            method = "reflinked"
+        except (OSError, ImportError):
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            shutil.copy2(source_path, target_path)
+            method = "copied"
+    if stats is not None:
+        stats[method] = stats.get(method, 0) + 1
+
+
+def dedup_outputs(mod_dir):
+    """
+    按内容哈希将 version-* 中内容相同的 CSV 硬链接为同一文件
+    只对大小相同的文件计算哈希，返回 (链接数量, 节省字节数)
+    """
+    by_size = {}
+    for version_dir in version_dir_names(mod_dir):
+        for root, dirs, files in os.walk(os.path.join(mod_dir, version_dir)):
+            for file in files:
+                if file.endswith(".csv"):
+                    path = os.path.join(root, file)
+                    by_size.setdefault(os.path.getsize(path), []).append(path)
+    linked = 0
+    saved = 0
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        by_hash = {}
+        for path in sorted(paths):
+            by_hash.setdefault(file_hash(path), []).append(path)
+        for same in by_hash.values():
+            first = os.stat(same[0])
+            for path in same[1:]:
+                stat = os.stat(path)
+                if (stat.st_dev, stat.st_ino) == (first.st_dev, first.st_ino):
+                    continue
+                tmp_path = f"{path}.dedup"
+                try:
+                    os.link(same[0], tmp_path)
+                except OSError:
+                    continue
+                os.replace(tmp_path, path)
+                linked += 1
+                saved += size
+    return linked, saved
+
+
+def run_conversions(data_dir, mod_dir, file_names, jobs):
+    """转换一组 TOML 文件，jobs > 1 时使用进程池，结果按 file_names 顺序返回"""
+    if jobs > 1 and len(file_names) > 1:
+        results = []
+        # 子进程使用与主进程相同的解析缓存
+        cache = toml_cache.get_cache()
+        cache_args = (cache.cache_dir, cache.max_bytes) if cache else (None,)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=toml_cache.configure, initargs=cache_args) as executor:
+            futures = [executor.submit(convert_file, data_dir, mod_dir, file_name) for file_name in file_names]
+            for file_name, future in zip(file_names, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # 子进程异常退出等情况
+                    results.append({'file_name': file_name, 'version': None, 'files': [], 'empty': {},
+                                    'error': True,
+                                    'messages': [f"[ERROR] Failed to process {os.path.join(data_dir, file_name)}: {e}"]})
+        return results
+    return [convert_file(data_dir, mod_dir, file_name) for file_name in file_names]
+
+
+def convert_toml_to_csv(data_dir, mod_dir, jobs=1, manifest_path=None, dedup=False):
+    """
+    将TOML文件转换为CSV文件，jobs > 1 时使用多进程并行转换
+    指定 manifest_path 时增量转换：只重新生成源文件哈希变化的 CSV，并删除已删除 mod 的输出
+    dedup 为 True 时将各版本文件夹中内容相同的 CSV 硬链接为同一文件
+    """
+    incremental = manifest_path is not None
+    old_files = {}
+    if incremental:
+        manifest = load_manifest(manifest_path)
+        if manifest is None:
+            print("No valid manifest found, rebuilding all version folders")
+            os.makedirs(mod_dir, exist_ok=True)
+            for version_dir in version_dir_names(mod_dir):
+                shutil.rmtree(os.path.join(mod_dir, version_dir))
+        else:
+            old_files = manifest["files"]
+
+    # 第一阶段：处理所有 TOML 文件（包括 default）
+    empty_totals = {}  # 各语言被跳过的空翻译总数
+    failed_count = 0
+    file_names = sorted(f for f in os.listdir(data_dir) if f.endswith(".toml"))
+    hashes = {file_name: file_hash(os.path.join(data_dir, file_name)) for file_name in file_names} if incremental else {}
+
+    # 清单记录: 文件名 -> {hash, version, outputs(相对 mod_dir), names(default 版本的 CSV 文件名)}
+    new_files = {}
+    to_convert = []
+    for file_name in file_names:
+        old = old_files.get(file_name)
+        if (old and old["hash"] == hashes[file_name]
+                and (old["version"] == "default"
+                     or all(os.path.exists(os.path.join(mod_dir, rel)) for rel in old["outputs"]))):
+            new_files[file_name] = old
+        else:
+            to_convert.append(file_name)
+    # 删除已删除或已变化的 TOML 的旧输出
+    removed_count = 0
+    for file_name, old in old_files.items():
+        if file_name not in new_files:
+            removed_count += remove_outputs(mod_dir, old["outputs"])
+
+    default_sources = {}  # 本次生成的 default 文件: 文件名 -> [(csv_file_name, source_path)]
+    link_stats = {}
+
+    def record(results):
+        nonlocal failed_count
+        # 按文件名顺序输出，保证串行与并行的日志一致
+        for result in results:
+            for message in result['messages']:
+                print(message)
+            if result['error']:
+                failed_count += 1
+                continue
+            if result['version'] is None:
+                continue
+            for lang_code, count in result['empty'].items():
+                empty_totals[lang_code] = empty_totals.get(lang_code, 0) + count
+            entry = {"hash": hashes.get(result['file_name']), "version": result['version'], "outputs": []}
+            if result['version'] == "default":
                 # 如果是 default 版本，记录生成的文件
-                if version == "default":
-                    default_files[mod_id] = {
-                        'output_dir': output_dir,
-                        'files': generated_files
-                    }
-                    
-            except Exception as e:
-                print(f"[ERROR] Failed to process {toml_path}: {e}")
-
-    # 第二阶段：将 default 文件复制到其他版本文件夹
-    if default_files:
-        version_dirs = [d for d in os.listdir(mod_dir) if d.startswith("version-") and os.path.isdir(os.path.join(mod_dir, d))]
-        
-        for mod_id, default_info in default_files.items():
-            for version_dir in version_dirs:
-                target_localization_dir = os.path.join(mod_dir, version_dir, "Localizations")
-                os.makedirs(target_localization_dir, exist_ok=True)
-                
-                for csv_file_name, source_path in default_info['files']:
-                    target_path = os.path.join(target_localization_dir, csv_file_name)
-                    
-                    # 只在目标文件不存在时复制
-                    if not os.path.exists(target_path):
-                        shutil.copy2(source_path, target_path)
-
-    # 删除 default 目录
+                entry["names"] = [csv_file_name for csv_file_name, _ in result['files']]
+                default_sources[result['file_name']] = result['files']
+            else:
+                entry["outputs"] = [os.path.relpath(csv_path, mod_dir) for _, csv_path in result['files']]
+            new_files[result['file_name']] = entry
+
+    record(run_conversions(data_dir, mod_dir, to_convert, jobs))
+
+    # 第二阶段：将 default 文件复制到其他版本文件夹（不覆盖各版本自己的文件）
+    if incremental:
+        version_dirs = sorted({f"version-{parsed[1]}" for parsed in map(parse_toml_name, file_names)
+                               if parsed and parsed[1] != "default"})
+    else:
+        version_dirs = version_dir_names(mod_dir) if os.path.isdir(mod_dir) else []
+    versioned_outputs = {rel for entry in new_files.values() if entry["version"] != "default"
+                         for rel in entry["outputs"]}
+
+    def fan_out_targets(entry):
+        return [os.path.join(version_dir, "Localizations", csv_file_name)
+                for version_dir in version_dirs for csv_file_name in entry["names"]
+                if os.path.join(version_dir, "Localizations", csv_file_name) not in versioned_outputs]
+
+    def fan_out(file_name):
+        sources = dict(default_sources[file_name])
+        targets = fan_out_targets(new_files[file_name])
+        for rel_path in targets:
+            target_path = os.path.join(mod_dir, rel_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            link_output(sources[os.path.basename(rel_path)], target_path, link_stats)
+        new_files[file_name]["outputs"] = targets
+
+    default_names = [file_name for file_name in sorted(new_files) if new_files[file_name]["version"] == "default"]
+    to_refresh = []
+    for file_name in default_names:
+        entry = new_files[file_name]
+        if file_name in default_sources:
+            fan_out(file_name)
+            continue
+        # 未变化的 default 文件：版本目录或各版本自己的文件变化时才需要更新
+        targets = fan_out_targets(entry)
+        removed_count += remove_outputs(mod_dir, [rel for rel in entry["outputs"]
+                                                  if rel not in targets and rel not in versioned_outputs])
+        if all(os.path.exists(os.path.join(mod_dir, rel)) for rel in targets):
+            entry["outputs"] = targets
+        else:
+            to_refresh.append(file_name)
+            del new_files[file_name]
+    if to_refresh:
+        record(run_conversions(data_dir, mod_dir, to_refresh, jobs))
+        for file_name in to_refresh:
+            if file_name in default_sources and file_name in new_files:
+                fan_out(file_name)
+
+    if empty_totals:
+        details = ", ".join(f"{lang_code}={count}" for lang_code, count in sorted(empty_totals.items()))
+        print(f"[Info] Empty translations skipped in total: {details}")
+    if failed_count > 0:
+        print(f"[ERROR] Conversion failed for {failed_count} of {len(file_names)} TOML files")
+
+    if link_stats:
+        print("Default fan-out: " + ", ".join(f"{count} {method}" for method, count in sorted(link_stats.items())))
+
+    # 删除 default 目录（硬链接的目标文件不受影响）
     default_dir = os.path.join(mod_dir, "default")
     if os.path.exists(default_dir):
         print(f"Removing default directory: {default_dir}")
         shutil.rmtree(default_dir)
 
+    if dedup and os.path.isdir(mod_dir):
+        linked, saved = dedup_outputs(mod_dir)
+        print(f"Deduplicated {linked} identical CSV files, saved {saved} bytes")
+
+    if incremental:
+        prune_empty_dirs(mod_dir)
+        save_manifest(manifest_path, new_files)
+        print(f"Incremental conversion: {len(to_convert) + len(to_refresh)} converted, "
+              f"{len(file_names) - len(to_convert) - len(to_refresh)} unchanged, "
+              f"{removed_count} stale outputs removed")
+
+    return failed_count
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: convert_toml_to_csv.py <data_dir> <mod_dir>")
+    parser = argparse.ArgumentParser(description="Convert data TOML files to localization CSV files")
+    parser.add_argument("data_dir", help="Directory containing the TOML data files")
+    parser.add_argument("mod_dir", help="Output directory for the version-* folders")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Number of worker processes, 0 uses all CPUs (default: 1)")
+    parser.add_argument("--manifest", default=None,
+                        help="Manifest file for incremental conversion; only CSVs of changed TOMLs are regenerated")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Hardlink identical CSV files across version folders")
+    parser.add_argument("--toml-cache", default=None,
+                        help="Directory caching parsed TOML files by path, size and mtime")
+    parser.add_argument("--toml-cache-mb", type=int, default=256,
+                        help="Size limit of the TOML cache in MB (default: 256)")
+    args = parser.parse_args()
+
+    toml_cache.configure(args.toml_cache, args.toml_cache_mb * 1024 * 1024)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if convert_toml_to_csv(args.data_dir, args.mod_dir, jobs, args.manifest, args.dedup) > 0:
         sys.exit(1)
-    
-    data_dir = sys.argv[1]
-    mod_dir = sys.argv[2]
-    
-    convert_toml_to_csv(data_dir, mod_dir)
@@ -6,26 +6,43 @@ Focus: Fetch new mods, download them, and update TOML data files
 Translation handled by cloud workflow, but git operations for data repository remain
 Single-version tracking: Only keep latest version, merge unique keys from older versions
 Target utils version:
-workshop: 1.0.x
-config: 1.0.x
-file: 3.0.x
+workshop: 1.1.x
+config: 1.1.x
+file: 3.5.x
 steamcmd: 1.0.x
-helper: 1.0.x
-mod_target: 3.1.x
-git: 1.0.x
+helper: 1.2.x
+mod_target: 3.2.x
+git: 1.1.x
+mirror: 1.1.x
+toml_cache: 1.0.x
+shard: 1.0.x
+metrics: 1.0.x
+profiler: 1.0.x
+changeset: 1.0.x
+registry: 1.1.x
 """
-from util.workshop import *
-from util.config import *
-from util.file import *
-from util.steamcmd import *
-from util.helper import *
-from util.git import *
+from util.workshop import WorkshopNewMods
+from util.config import Config
+from util.steamcmd import steamdownloader, parse_mod_info
+from util.helper import search_versions, search_file, search_language_files
+from util.git import Git
 from util.mod_target import ModTarget
+from util.mirror import DataMirror
+from util import toml_cache
+from util.shard import parse_shard, select_mods, write_shard_manifest
+from util.metrics import configure as configure_metrics
+from util.profiler import StepProfiler, NullProfiler
+from util.changeset import Changeset, CHANGESET_FILE
+from util.registry import ModRegistry, REGISTRY_FILE, STATUS_INVALID
 from util.reorder import batch_download_with_delay
 import argparse
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 def parse_args():
@@ -40,7 +57,33 @@ def parse_args():
                         help="Number of mods per batch download (default: 5)")
     parser.add_argument("--batch-delay", type=int, default=5,
                         help="Minutes to wait between batch downloads (default: 5)")
-    return parser.parse_args()
+    parser.add_argument("--shard", type=str, default=None,
+                        help="Process only shard i of N (format i/N); data files and shard.json are written "
+                             "to --shard-dir, config save and push are skipped (merge with util.shard)")
+    parser.add_argument("--shard-dir", type=str, default=None,
+                        help="Output directory of a shard run (default: shards/shard-i)")
+    parser.add_argument("--metrics-json", type=str, default=None,
+                        help="Write step timers, per-mod spans and I/O counters to this JSON file")
+    parser.add_argument("--metrics-prom", type=str, default=None,
+                        help="Write the same metrics as a Prometheus textfile (node_exporter textfile collector)")
+    parser.add_argument("--changeset", type=str, default=None,
+                        help="Write the keys added, changed, abandoned and carried from older versions per mod "
+                             "to this JSON file (default: changeset.json, in the shard directory for shard runs)")
+    parser.add_argument("--profile", type=str, default=None, metavar="DIR",
+                        help="Write a cProfile dump and tracemalloc snapshot per step to DIR and a "
+                             "hotspot summary next to the log file")
+    parser.add_argument("--profile-mods", type=str, default=None,
+                        help="Comma-separated mod IDs; only these mods are processed, "
+                             "config save and push are skipped")
+    args = parser.parse_args()
+    if args.profile_mods is not None:
+        args.profile_mods = [mod_id.strip() for mod_id in args.profile_mods.split(",") if mod_id.strip()]
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
 
 
 def skip_step(step_num, args):
@@ -53,14 +96,28 @@ def skip_step(step_num, args):
     return False
 
 
-CONFIG_CHANGED = False
+def timed_call(func):
+    """Call func and return (result, seconds taken)"""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records unformatted, QueueHandler.prepare would format them on the calling thread
+    The listener's handlers format them instead; records never leave the process
+    """
+    def prepare(self, record):
+        return record
 
 
 def main():
     args = parse_args()
-    global CONFIG_CHANGED
 
     # Step 0: Initialize paths and configuration
+    metrics = configure_metrics(bool(args.metrics_json or args.metrics_prom))
+    profiler = StepProfiler(args.profile) if args.profile else NullProfiler()
     workpath = os.getcwd()
     config = Config(os.path.join(workpath, "config.toml"))
     game_mod_path = os.path.join(workpath, "steamcmd", "steamapps", "workshop", "content", str(config["workshop"]["game_id"]))
@@ -70,14 +127,13 @@ def main():
     if not os.path.exists(git_path):
         os.makedirs(git_path)
     if config["git"]["enabled"]:
-        git = Git(git_path, config["git"]["branch"])
+        git = Git(git_path, config["git"]["branch"], depth=config["git"].get("depth") or None)
     data_path = os.path.join(git_path, "data")
     if not os.path.exists(data_path):
         os.makedirs(data_path)
 
     # Setup logger
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
 
     file_handler = logging.FileHandler(config["common"]["logPath"], encoding='utf-8')
     file_handler.setLevel(config["common"]["fileLevel"])
@@ -89,8 +145,19 @@ def main():
     console_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     console_handler.setFormatter(console_formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Records below every handler level are dropped before they are formatted
+    logger.setLevel(min(file_handler.level, console_handler.level))
+    if config["common"].get("logQueue", False):
+        # Formatting and file/console writes happen on the listener thread
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                                  respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(RecordQueueHandler(log_queue))
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
 
     logger.info("=" * 80)
     logger.info("Timberborn Mod Data Update Tool v3.2")
@@ -99,163 +166,274 @@ def main():
     logger.info("Single-version tracking with old version key merging")
     logger.info("=" * 80)
 
+    # Tracked mods live in the registry, the id lists of config.toml only seed a new registry
+    registry_config = config.config.get("registry", {})
+    registry = ModRegistry(os.path.join(workpath, registry_config.get("path", REGISTRY_FILE)))
+    if not registry.exists:
+        registry.seed(config["workshop"]["ids"], config["workshop"].get("blacklist_ids", []))
+
     # Pull data repository if git enabled
+    # Steps 1-3 do not read git/data, so the pull runs in the background until Step 4
+    pull_executor = None
+    pull_future = None
     if config["git"]["enabled"]:
-        logger.info("Step 0: Pulling data repository...")
-        git.pull()
+        logger.info("Step 0: Pulling data repository in the background...")
+        pull_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="git-pull")
+        pull_future = pull_executor.submit(timed_call, git.pull)
 
     # Step 1: Fetch new mods from Steam Workshop
-    if skip_step(1, args):
-        logger.info("Step 1: SKIPPED (fetching new mods)")
-    else:
-        logger.info("Step 1: Fetching latest mods from Steam Workshop...")
-        workshop = WorkshopNewMods(config["workshop"]["game_id"], config["workshop"]["text"])
-        new_mods = workshop.get_mods(config["workshop"]["depth"])
-
-        new_mod_count = 0
-        for mod_id in new_mods:
-            if mod_id not in config["workshop"]["ids"]:
-                config["workshop"]["ids"].append(mod_id)
-                new_mod_count += 1
-                logger.info(f"New mod found: {mod_id}")
-        logger.info(f"Found {new_mod_count} new mods")
-        if new_mod_count > 0:
-            CONFIG_CHANGED = True
-
-    # Remove blacklisted mods
-    for black_id in config["workshop"]["blacklist_ids"]:
-        if black_id in config["workshop"]["ids"]:
-            config["workshop"]["ids"].remove(black_id)
-            logger.info(f"Mod {black_id} is blacklisted and removed from the list")
-
-    logger.info(f"Total mods to process: {len(config['workshop']['ids'])}")
+    with metrics.timer("step", step="1"), profiler.step("1"):
+        if skip_step(1, args):
+            logger.info("Step 1: SKIPPED (fetching new mods)")
+        else:
+            logger.info("Step 1: Fetching latest mods from Steam Workshop...")
+            workshop = WorkshopNewMods(config["workshop"]["game_id"], config["workshop"]["text"])
+            new_mods = workshop.get_mods(config["workshop"]["depth"])
+
+            new_mod_count = 0
+            for mod_id in new_mods:
+                if registry.add(mod_id):
+                    new_mod_count += 1
+                    logger.info(f"New mod found: {mod_id}")
+            logger.info(f"Found {new_mod_count} new mods")
+
+    # Blacklisted mods in config.toml are kept in the registry but never processed
+    blacklisted, released = registry.sync_blacklist(config["workshop"].get("blacklist_ids", []))
+    for black_id in blacklisted:
+        logger.info(f"Mod {black_id} is blacklisted and removed from the list")
+    for mod_id in released:
+        logger.info(f"Mod {mod_id} is no longer blacklisted and is active again")
+    mod_ids = registry.ids()
+
+    # Profiling a subset of mods
+    if args.profile_mods:
+        mod_ids = [mod_id for mod_id in mod_ids if mod_id in args.profile_mods]
+        logger.info(f"Restricted to {len(mod_ids)} mods for profiling")
+
+    # Sharded run: keep only the mods of this shard, outputs go to the shard directory
+    output_path = data_path
+    changeset_path = args.changeset or os.path.join(workpath, CHANGESET_FILE)
+    if args.shard is not None:
+        shard_index, shard_count = args.shard
+        shard_dir = args.shard_dir or os.path.join(workpath, "shards", f"shard-{shard_index}")
+        output_path = os.path.join(shard_dir, "data")
+        changeset_path = args.changeset or os.path.join(shard_dir, CHANGESET_FILE)
+        all_ids = mod_ids
+        mod_ids = select_mods(all_ids, shard_index, shard_count)
+        shard_ids = list(mod_ids)
+        logger.info(f"Shard {shard_index}/{shard_count}: {len(shard_ids)} of {len(all_ids)} mods, "
+                    f"output to {shard_dir}")
+
+    logger.info(f"Total mods to process: {len(mod_ids)}")
 
     # Step 2: Download mods using steamcmd with batch processing
-    if skip_step(2, args):
-        logger.info("Step 2: SKIPPED (downloading mods)")
-    else:
-        logger.info("Step 2: Downloading mods using SteamCMD (batch mode)...")
-        steamClient = steamdownloader(config["steam"]["username"], os.path.join(workpath, "steamcmd"))
-
-        # Filter out already-downloaded mods
-        ids_to_download = []
-        for mod_id in config["workshop"]["ids"]:
-            mod_path = os.path.join(game_mod_path, mod_id)
-            ws_json = os.path.join(mod_path, "workshop_data.json")
-            en_csv = os.path.join(mod_path, "Localizations", "enUS.csv")
-            if os.path.exists(ws_json) or os.path.exists(en_csv):
-                logger.debug(f"Mod {mod_id} already downloaded, skipping")
-            else:
-                ids_to_download.append(mod_id)
-
-        if ids_to_download:
-            logger.info(f"Need to download {len(ids_to_download)} mods "
-                        f"(out of {len(config['workshop']['ids'])} total)")
-            batch_download_with_delay(
-                steamClient,
-                config["workshop"]["game_id"],
-                ids_to_download,
-                batch_size=args.batch_size,
-                delay_minutes=args.batch_delay
-            )
+    with metrics.timer("step", step="2"), profiler.step("2"):
+        if skip_step(2, args):
+            logger.info("Step 2: SKIPPED (downloading mods)")
         else:
-            logger.info("All mods already downloaded, nothing to do")
-
-    # Step 3: Create ModTarget instances for each mod
-    logger.info("Step 3: Creating mod targets...")
-    mod_targets = {}
-    valid_mod_ids = []
-    total_ids = len(config["workshop"]["ids"])
-
-    for idx, id in enumerate(config["workshop"]["ids"]):
-        try:
-            if idx % 50 == 0:
-                logger.info(f"Step 3 progress: {idx}/{total_ids}")
-            mod_path = os.path.join(game_mod_path, id)
-
-            # Skip mods that don't exist on disk (never downloaded)
-            if not os.path.exists(mod_path):
-                logger.warning(f"Mod {id} directory not found, skipping")
-                continue
-
-            mod_name = parse_mod_info(os.path.join(mod_path, "workshop_data.json"))
-            versions = search_versions(mod_path)
-            if not versions:
-                logger.warning(f"Mod {id} has no version subdirectories, skipping")
-                continue
-            support_versions = search_file(mod_path, versions, keyword="en")
-
-            if support_versions is None or not support_versions:
-                logger.warning(f"Mod {id} cannot find any translation files")
-                continue
-
-            mod_target = ModTarget(
-                mod_id=id,
-                mod_name=mod_name,
-                mod_path=mod_path
-            )
-
-            for support_version, raw_file_path in support_versions.items():
-                if raw_file_path is None:
-                    continue
-                if mod_target.add_version(support_version, raw_file_path):
-                    logger.info(f"Added version {support_version} for mod {id}")
-
-            if mod_target.has_valid_versions():
-                mod_targets[id] = mod_target
-                valid_mod_ids.append(id)
+            logger.info("Step 2: Downloading mods using SteamCMD (batch mode)...")
+            steamClient = steamdownloader(config["steam"]["username"], os.path.join(workpath, "steamcmd"))
+
+            # Filter out already-downloaded mods
+            ids_to_download = []
+            for mod_id in mod_ids:
+                mod_path = os.path.join(game_mod_path, mod_id)
+                ws_json = os.path.join(mod_path, "workshop_data.json")
+                en_csv = os.path.join(mod_path, "Localizations", "enUS.csv")
+                if os.path.exists(ws_json) or os.path.exists(en_csv):
+                    logger.debug(f"Mod {mod_id} already downloaded, skipping")
+                else:
+                    ids_to_download.append(mod_id)
+
+            if ids_to_download:
+                logger.info(f"Need to download {len(ids_to_download)} mods "
+                            f"(out of {len(mod_ids)} total)")
+                batch_download_with_delay(
+                    steamClient,
+                    config["workshop"]["game_id"],
+                    ids_to_download,
+                    batch_size=args.batch_size,
+                    delay_minutes=args.batch_delay
+                )
             else:
-                logger.warning(f"Mod {id} has no valid versions")
-        except Exception as e:
-            logger.error(f"Error creating mod target for mod {id}: {e}")
-
-    logger.info(f"Step 3 complete: {len(valid_mod_ids)}/{total_ids} mods loaded")
+                logger.info("All mods already downloaded, nothing to do")
 
-    # Update config with only valid mod IDs
-    config["workshop"]["ids"] = valid_mod_ids
+    # Step 3: Create ModTarget instances for each mod
+    with metrics.timer("step", step="3"), profiler.step("3"):
+        logger.info("Step 3: Creating mod targets...")
+        mod_targets = {}
+        valid_mod_ids = []
+        total_ids = len(mod_ids)
+        seed_languages = [lang for lang in config["translator"]["target_lang"]
+                          if lang != config["common"]["defaultLanguage"]]
+
+        for idx, id in enumerate(mod_ids):
+            with metrics.span("discovery", id):
+                try:
+                    if idx % 50 == 0:
+                        logger.info(f"Step 3 progress: {idx}/{total_ids}")
+                    mod_path = os.path.join(game_mod_path, id)
+
+                    # Skip mods that don't exist on disk (never downloaded)
+                    if not os.path.exists(mod_path):
+                        logger.warning(f"Mod {id} directory not found, skipping")
+                        continue
+
+                    mod_name = parse_mod_info(os.path.join(mod_path, "workshop_data.json"))
+                    versions = search_versions(mod_path)
+                    if not versions:
+                        logger.warning(f"Mod {id} has no version subdirectories, skipping")
+                        continue
+                    support_versions = search_file(mod_path, versions, keyword="en")
+
+                    if support_versions is None or not support_versions:
+                        logger.warning(f"Mod {id} cannot find any translation files")
+                        continue
+
+                    mod_target = ModTarget(
+                        mod_id=id,
+                        mod_name=mod_name,
+                        mod_path=mod_path,
+                        seed_languages=seed_languages
+                    )
+
+                    for support_version, raw_file_path in support_versions.items():
+                        if raw_file_path is None:
+                            continue
+                        if mod_target.add_version(support_version, raw_file_path):
+                            logger.info(f"Added version {support_version} for mod {id}")
+
+                    # Translations shipped by the mod author pre-fill empty language fields
+                    for version, language_files in search_language_files(mod_path, versions).items():
+                        mod_target.add_seed_files(version, language_files)
+
+                    if mod_target.has_valid_versions():
+                        mod_targets[id] = mod_target
+                        valid_mod_ids.append(id)
+                    else:
+                        logger.warning(f"Mod {id} has no valid versions")
+                except Exception as e:
+                    logger.error(f"Error creating mod target for mod {id}: {e}")
+
+        logger.info(f"Step 3 complete: {len(valid_mod_ids)}/{total_ids} mods loaded")
+
+    # Mods that could not be loaded are not processed again until the workshop lists them anew
+    valid_id_set = set(valid_mod_ids)
+    for mod_id in mod_ids:
+        if mod_id not in valid_id_set:
+            registry.set_status(mod_id, STATUS_INVALID)
+
+    # Optional cache of parsed data files, unchanged files are not parsed again
+    cache_config = config.config.get("toml_cache", {})
+    if cache_config.get("enabled", False):
+        toml_cache.configure(os.path.join(workpath, cache_config.get("path", "toml_cache")),
+                             int(cache_config.get("max_mb", 256)) * 1024 * 1024)
+
+    # Optional SQLite mirror of the data files, kept in sync as files are saved
+    mirror = None
+    mirror_config = config.config.get("mirror", {})
+    if mirror_config.get("enabled", False) and args.shard is None:
+        mirror = DataMirror(os.path.join(workpath, mirror_config.get("path", "mirror.sqlite")))
+
+    if pull_future is not None:
+        wait_start = time.perf_counter()
+        pulled, pull_time = pull_future.result()
+        waited = time.perf_counter() - wait_start
+        pull_executor.shutdown()
+        metrics.observe("step", pull_time, step="0")
+        metrics.observe("pull_wait", waited)
+        logger.info(f"Step 0 pull took {pull_time:.1f}s, waited {waited:.1f}s before Step 4 "
+                    f"(overlap saved {pull_time - waited:.1f}s)")
+        if not pulled:
+            logger.warning("Pulling the data repository failed, Step 4 uses the local data")
 
     # Step 4: Process each ModTarget to update data
-    logger.info("Step 4: Updating TOML data files...")
-    processed_count = 0
-    error_count = 0
-    step4_total = len(mod_targets)
-
-    for idx, (mod_id, mod_target) in enumerate(mod_targets.items()):
-        try:
-            if idx % 20 == 0:
-                logger.info(f"Step 4 progress: {idx}/{step4_total}")
-            logger.info(f"Processing mod {mod_id}: {mod_target.mod_name}")
-
-            mod_target.load_old_data(data_path)
-            mod_target.update_all_data()
-            mod_target.save_all_data(data_path)
-
-            processed_count += 1
-        except Exception as e:
-            logger.error(f"Error processing mod {mod_id}: {e}")
-            error_count += 1
-
-    logger.info(f"Step 4 complete: {processed_count} processed, {error_count} errors")
-
-    # Step 5: Save configuration
-    logger.info("Step 5: Saving configuration...")
-    config.save_config()
+    with metrics.timer("step", step="4"), profiler.step("4"):
+        logger.info("Step 4: Updating TOML data files...")
+        processed_count = 0
+        error_count = 0
+        saved_mod_ids = []
+        changeset = Changeset()
+        step4_total = len(mod_targets)
+
+        for idx, (mod_id, mod_target) in enumerate(mod_targets.items()):
+            try:
+                if idx % 20 == 0:
+                    logger.info(f"Step 4 progress: {idx}/{step4_total}")
+                logger.info(f"Processing mod {mod_id}: {mod_target.mod_name}")
+
+                with metrics.span("load", mod_id):
+                    mod_target.load_old_data(data_path)
+                with metrics.span("update", mod_id):
+                    mod_target.update_all_data()
+                changeset.add(mod_id, mod_target.latest_changes())
+                with metrics.span("save", mod_id):
+                    updated = mod_target.save_all_data(output_path, mirror)
+                if os.path.exists(os.path.join(output_path, f"{mod_id}.toml")):
+                    saved_mod_ids.append(mod_id)
+                registry.mark_processed(mod_id, updated)
+
+                processed_count += 1
+            except Exception as e:
+                logger.error(f"Error processing mod {mod_id}: {e}")
+                error_count += 1
+
+        logger.info(f"Step 4 complete: {processed_count} processed, {error_count} errors")
+        metrics.inc("mods_processed", processed_count)
+        metrics.inc("mod_errors", error_count)
+        changeset.write(changeset_path)
+    if mirror is not None:
+        mirror.close()
+    cache = toml_cache.get_cache()
+    if cache is not None:
+        logger.info(f"TOML cache: {cache.hits} hits, {cache.misses} misses")
+
+    # Step 5: Save the registry and config, shard runs write shard.json for `python -m util.shard merge` instead
+    with metrics.timer("step", step="5"), profiler.step("5"):
+        if args.shard is not None:
+            manifest_path = write_shard_manifest(shard_dir, {
+                "shard": shard_index,
+                "count": shard_count,
+                "ids": shard_ids,
+                "valid_ids": valid_mod_ids,
+                "data_files": saved_mod_ids,
+                "stats": {"processed": processed_count, "errors": error_count},
+            })
+            logger.info(f"Step 5-6: SKIPPED (shard run), shard manifest written to {manifest_path}")
+        elif args.profile_mods:
+            logger.info("Step 5-6: SKIPPED (run restricted by --profile-mods)")
+        else:
+            logger.info("Step 5: Saving mod registry and configuration...")
+            registry.save()
+            config.save_config()
 
     # Step 6: Push data repository if git enabled
-    if config["git"]["enabled"]:
-        logger.info("Step 6: Pushing updated data to repository...")
-        git.pull()
-        git.push()
+    with metrics.timer("step", step="6"), profiler.step("6"):
+        if config["git"]["enabled"] and args.shard is None and not args.profile_mods:
+            logger.info("Step 6: Pushing updated data to repository...")
+            # Only the data files of the processed mods are staged, not the whole work tree; files
+            # left unchanged cost an index stat, and files written by an interrupted run get committed.
+            # The Step 0 pull is recent enough, a rejected push is rebased and retried
+            git.push([os.path.join(output_path, f"{mod_id}.toml") for mod_id in saved_mod_ids])
 
     # Summary
     logger.info("=" * 80)
     logger.info("Processing complete!")
     logger.info(f"Mods processed: {processed_count}")
     logger.info(f"Errors: {error_count}")
-    logger.info(f"Data files saved to: {data_path}")
+    logger.info(f"Data files saved to: {output_path}")
     logger.info("Next: Cloud workflow will handle translation and publishing")
     logger.info("=" * 80)
 
+    if args.profile:
+        profiler.write_summary(os.path.splitext(config["common"]["logPath"])[0] + ".profile.txt")
+    if args.metrics_json:
+        metrics.export_json(args.metrics_json)
+        logger.info(f"Metrics written to {args.metrics_json}")
+    if args.metrics_prom:
+        metrics.export_prometheus(args.metrics_prom)
+        logger.info(f"Metrics written to {args.metrics_prom}")
+
 
 if __name__ == "__main__":
     main()
@@ -31,8 +31,10 @@ REPO_NAME="Timberborn_Mods_Universal_Translate"
 GETUPDATE=true
 FORCE_UPDATE=false
 OVERWRITE=false
+FULL_REBUILD=false
 PUSH_STEAM=true
 PUSH_GITHUB=true
+CONVERT_JOBS=0  # TOML to CSV worker processes, 0 = all CPUs
 
 # =========== Command Line Args ===========
 for arg in "$@"; do
@@ -43,6 +45,9 @@ for arg in "$@"; do
         -overwrite)
             OVERWRITE=true
             ;;
+        -full_rebuild)
+            FULL_REBUILD=true
+            ;;
         -skip_update)
             GETUPDATE=false
             ;;
@@ -94,49 +99,14 @@ if [ "$LOCAL" != "$REMOTE" ] || [ "$FORCE_UPDATE" = true ]; then
     
     mkdir -p "$MOD_INFO_DIR"
     
-    # =========== Update Version ===========
-    if [ -f "$MANIFEST_FILE" ]; then
-        if [ "$OVERWRITE" = true ]; then
-            echo "enabled -overwrite, skip version update."
-            new_version=$(grep -oP '"Version":\s*"\K2\.1\.\d+' "$MANIFEST_FILE" || echo "")
-        else
-            current_version=$(grep -oP '"Version":\s*"\K2\.1\.\d+' "$MANIFEST_FILE" || echo "")
-            if [ -z "$current_version" ]; then
-                echo "Error: Can't find version in manifest.json!"
-            else
-                echo "Now version: $current_version"
-                last_digit=$(echo "$current_version" | awk -F'.' '{print $3}')
-                version_head=$(echo "$current_version" | awk -F'.' '{print $1"."$2}')
-                new_last_digit=$((last_digit + 1))
-                new_version="${version_head}.${new_last_digit}"
-                echo "Version updated to: $new_version"
-                sed -i "0,/${current_version}/s/${current_version}/${new_version}/" "$MANIFEST_FILE"
-            fi
-        fi
-    else
-        echo "No manifest.json found, skip version update."
-    fi
-
-    # =========== Create Release ===========
-    rm -rf "$RELEASE_DIR"
-    mkdir -p "$RELEASE_DIR"
-
-    # 检查 CONTEXT_DIR 是否存在且非空
-    if [ -d "$CONTEXT_DIR" ] && [ "$(ls -A "$CONTEXT_DIR")" ]; then
-        cp -r "$CONTEXT_DIR"/* "$RELEASE_DIR"/
-    else
-        echo "Warning: $CONTEXT_DIR is empty or does not exist. Skipping copy."
-    fi
-
-    cp -r "$MOD_INFO_DIR"/thumbnail.png "$RELEASE_DIR"/
-    cp -r "$MOD_INFO_DIR"/workshop_data.json "$RELEASE_DIR"/
-    cp -r "$MOD_INFO_DIR"/License.txt "$RELEASE_DIR"/
-
-    # 清理目录
+    # 增量转换：只重新生成源 TOML 变化的 CSV，已删除 mod 的输出由清单清理
     DATA_DIR="$GIT_DIR/data"
     MOD_DIR="$GIT_DIR/mod"
-    echo "Cleaning up old localization directories..."
-    find "$MOD_DIR" -type d -name "version-*" -exec rm -rf {} +
+    CONVERT_MANIFEST="$BASE_DIR/convert_manifest.json"
+    if [ "$FULL_REBUILD" = true ]; then
+        echo "enabled -full_rebuild, regenerating all localization files."
+        rm -f "$CONVERT_MANIFEST"
+    fi
 
     # =========== Convert TOML to CSV ===========
     echo "Converting TOML files to CSV..."
@@ -153,10 +123,27 @@ if [ "$LOCAL" != "$REMOTE" ] || [ "$FORCE_UPDATE" = true ]; then
     fi
     
     # 调用独立的Python脚本并重定向输出
-    python3 "$PYTHON_SCRIPT" "$DATA_DIR" "$MOD_DIR" 2>&1 | tee "$PYTHON_LOG_FILE"
+    python3 "$PYTHON_SCRIPT" "$DATA_DIR" "$MOD_DIR" --jobs "$CONVERT_JOBS" --manifest "$CONVERT_MANIFEST" --dedup --toml-cache "$BASE_DIR/toml_cache" 2>&1 | tee "$PYTHON_LOG_FILE"
 
     echo "TOML to CSV conversion completed."
 
+    # =========== Create Release ===========
+    # 转换完成后再创建 release 目录，确保包含本次生成的 CSV
+    rm -rf "$RELEASE_DIR"
+    mkdir -p "$RELEASE_DIR"
+
+    # 检查 CONTEXT_DIR 是否存在且非空
+    if [ -d "$CONTEXT_DIR" ] && [ "$(ls -A "$CONTEXT_DIR")" ]; then
+        # 保留硬链接，内容相同的 CSV 只占用一份空间
+        cp -r --preserve=links "$CONTEXT_DIR"/* "$RELEASE_DIR"/
+    else
+        echo "Warning: $CONTEXT_DIR is empty or does not exist. Skipping copy."
+    fi
+
+    cp -r "$MOD_INFO_DIR"/thumbnail.png "$RELEASE_DIR"/
+    cp -r "$MOD_INFO_DIR"/workshop_data.json "$RELEASE_DIR"/
+    cp -r "$MOD_INFO_DIR"/License.txt "$RELEASE_DIR"/
+
     # =========== 从release目录读取版本 ===========
     echo "Scanning release directory for version folders..."
     VERSIONS=()
@@ -177,6 +164,40 @@ if [ "$LOCAL" != "$REMOTE" ] || [ "$FORCE_UPDATE" = true ]; then
 
     echo "Found game versions: ${VERSIONS[@]}"
 
+    # =========== Check Release Content ===========
+    # 与上次发布的内容清单比较（不含 manifest.json），内容未变化时跳过发布
+    CONTENT_STATE_DIR="$MOD_INFO_DIR/release_manifests"
+    CHANGE_CHECK_RC=0
+    CHANGE_SUMMARY=$(cd "$BASE_DIR" && python3 -m util.release check "$RELEASE_DIR" "$CONTENT_STATE_DIR") || CHANGE_CHECK_RC=$?
+    echo "Release changes: $CHANGE_SUMMARY"
+    if [ "$CHANGE_CHECK_RC" -eq 3 ] && [ "$FORCE_UPDATE" != true ]; then
+        echo "Release content unchanged since last release, skip publishing."
+        exit 0
+    fi
+
+    # =========== Update Version ===========
+    if [ -f "$MANIFEST_FILE" ]; then
+        if [ "$OVERWRITE" = true ]; then
+            echo "enabled -overwrite, skip version update."
+            new_version=$(grep -oP '"Version":\s*"\K2\.1\.\d+' "$MANIFEST_FILE" || echo "")
+        else
+            current_version=$(grep -oP '"Version":\s*"\K2\.1\.\d+' "$MANIFEST_FILE" || echo "")
+            if [ -z "$current_version" ]; then
+                echo "Error: Can't find version in manifest.json!"
+            else
+                echo "Now version: $current_version"
+                last_digit=$(echo "$current_version" | awk -F'.' '{print $3}')
+                version_head=$(echo "$current_version" | awk -F'.' '{print $1"."$2}')
+                new_last_digit=$((last_digit + 1))
+                new_version="${version_head}.${new_last_digit}"
+                echo "Version updated to: $new_version"
+                sed -i "0,/${current_version}/s/${current_version}/${new_version}/" "$MANIFEST_FILE"
+            fi
+        fi
+    else
+        echo "No manifest.json found, skip version update."
+    fi
+
     # 为每个版本创建manifest.json
     for version in "${VERSIONS[@]}"; do
         RELEASE_VERSION_DIR="$RELEASE_DIR/version-$version"
@@ -184,10 +205,14 @@ if [ "$LOCAL" != "$REMOTE" ] || [ "$FORCE_UPDATE" = true ]; then
         cp -r "$MOD_INFO_DIR"/manifest.json "$RELEASE_VERSION_DIR"/
     done
 
+    # 任一发布目标失败时不记录内容清单，下次运行会重新发布
+    PUBLISH_FAILED=false
+
     # =========== Push to Steam Workshop ===========
     if [ "$PUSH_STEAM" = true ]; then
         cd "$STEAMCMDDIR"
-        changenote="Automated Updates ${new_version:-unknown}"
+        changenote="Automated Updates ${new_version:-unknown}
+${CHANGE_SUMMARY//\"/\'}"
 
         cat <<EOF > workshop.vdf
 "workshopitem"
@@ -208,6 +233,7 @@ EOF
             +workshop_build_item "$(pwd)/workshop.vdf" \
             +quit || {
                 echo "Error: SteamCMD Upload Failed!"
+                PUBLISH_FAILED=true
             }
     else
         echo "Info: -push_steam is disabled by user; skipping Steam Workshop upload."
@@ -239,7 +265,11 @@ EOF
 
         rm -rf "$TMP_FOLDER"
 
-        RELEASE_NOTES="Automated Update to $new_version"
+        RELEASE_NOTES="Automated Update to $new_version
+
+\`\`\`
+$CHANGE_SUMMARY
+\`\`\`"
         
         # 检查Python日志文件是否有内容
         if [ -f "$PYTHON_LOG_FILE" ] && [ -s "$PYTHON_LOG_FILE" ]; then
@@ -296,6 +326,7 @@ $PYTHON_LOG_CONTENT
             --notes "$RELEASE_NOTES" \
             "$RELEASE_ZIP" || {
                 echo "Error: GitHub Release creation failed!"
+                PUBLISH_FAILED=true
             }
 
         if [ -f "$RELEASE_ZIP" ]; then
@@ -314,6 +345,13 @@ $PYTHON_LOG_CONTENT
         echo "Info: -push_github is disabled by user; skipping GitHub release."
     fi
 
+    # 记录本次发布的内容清单，供下次比较
+    if [ "$PUBLISH_FAILED" = true ]; then
+        echo "Warning: Publishing failed, the release content is not recorded and will be published again next run."
+    elif [ "$PUSH_STEAM" = true ] || [ "$PUSH_GITHUB" = true ]; then
+        (cd "$BASE_DIR" && python3 -m util.release save "$RELEASE_DIR" "$CONTENT_STATE_DIR" --version "${new_version:-unknown}")
+    fi
+
 else
     echo "No updates detected, skip."
 fi
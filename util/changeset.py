@@ -0,0 +1,90 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+This module provides the per-run changeset of the data repository
+Step 4 records which keys every mod added, changed, abandoned or newly merged from
+older versions; the changeset is written as one compact JSON file so that the
+cloud translation workflow and release notes can process only the delta
+Target utils version:
+file: 3.5.x
+"""
+import os
+import json
+import time
+import logging
+from typing import Dict, Iterable, List
+from .file import CHANGE_KINDS
+
+CHANGESET_FORMAT = 1
+CHANGESET_FILE = "changeset.json"
+
+
+class Changeset:
+    """
+    Key changes of one run, keyed by mod id
+    Mods without changes are left out, as are empty change lists
+    """
+    mods: Dict[str, Dict[str, List[str]]]
+    logger: logging.Logger
+
+    def __init__(self) -> None:
+        self.created_at = time.time()
+        self.mods = {}
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def add(self, mod_id: str, changes: Dict[str, List[str]]) -> None:
+        entry = {kind: list(changes[kind]) for kind in CHANGE_KINDS if changes.get(kind)}
+        if entry:
+            self.mods[str(mod_id)] = entry
+        else:
+            self.mods.pop(str(mod_id), None)
+
+    def totals(self) -> Dict[str, int]:
+        totals = {kind: 0 for kind in CHANGE_KINDS}
+        for entry in self.mods.values():
+            for kind, keys in entry.items():
+                totals[kind] += len(keys)
+        totals["mods"] = len(self.mods)
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "format": CHANGESET_FORMAT,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.created_at)),
+            "totals": self.totals(),
+            # Sorted so that sharded and unsharded runs produce the same file
+            "mods": {mod_id: self.mods[mod_id] for mod_id in sorted(self.mods)},
+        }
+
+    def write(self, path: str) -> None:
+        """Write the changeset atomically without indentation"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        totals = self.totals()
+        self.logger.info(f"Changeset written to {path}: {totals['mods']} mods, " +
+                         ", ".join(f"{totals[kind]} {kind}" for kind in CHANGE_KINDS))
+
+    @classmethod
+    def load(cls, path: str) -> "Changeset":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != CHANGESET_FORMAT:
+            raise ValueError(f"Unsupported changeset format {data.get('format')!r} in {path}")
+        changeset = cls()
+        for mod_id, changes in data["mods"].items():
+            changeset.add(mod_id, changes)
+        return changeset
+
+
+def merge_changesets(paths: Iterable[str]) -> Changeset:
+    """Combine the changesets of several runs, later files win for a mod present in more than one"""
+    merged = Changeset()
+    for path in paths:
+        for mod_id, changes in Changeset.load(path).mods.items():
+            merged.add(mod_id, changes)
+    return merged
@@ -1,10 +1,13 @@
 """
-version: 1.0.0
+version: 1.1.0
 author: Wuyilingwei
 This module provides config management
 This module is used to load and save (fix) config file
+The file is not rewritten on load, save_config only writes it when the
+content differs from what was loaded
 """
 import os
+import copy
 import logging
 from typing import Any, Dict, Optional
 import toml
@@ -16,6 +19,7 @@ class Config:
     """
     config_path: str
     config: Dict[str, Any]
+    saved: Dict[str, Any]
     logger: logging.Logger
 
     def __init__(self, config_path: str) -> None:
@@ -24,9 +28,9 @@ class Config:
         """
         self.config_path = config_path
         self.config = {}
+        self.saved = {}
         self.logger = logging.getLogger(self.__class__.__name__)
         self.load_config()
-        self.save_config()
 
     def __getitem__(self, key: str) -> Any:
         """
@@ -52,6 +56,8 @@ class Config:
                 self.config = toml.load(f)
                 self.logger.info(f"Config file loaded from {self.config_path}")
                 self.logger.debug(f"Config file content: {self.config}")
+        # Defaults filled in by validate_config count as a change, save_config fixes the file
+        self.saved = copy.deepcopy(self.config)
         self.validate_config()
 
     def validate_config(self) -> None:
@@ -98,10 +104,18 @@ class Config:
                     validate_recursive(current[key], value)
         validate_recursive(self.config, default_config)
 
-    def save_config(self) -> None:
+    def save_config(self) -> bool:
         """
-        Save config file to config_path
+        Save config file to config_path if it changed since it was loaded or saved
+        Returns True if the file was written
         """
-        with open(self.config_path, "w", encoding="utf-8") as f:
+        if os.path.exists(self.config_path) and self.config == self.saved:
+            self.logger.info(f"Config unchanged, kept {self.config_path}")
+            return False
+        tmp_path = f"{self.config_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             toml.dump(self.config, f)
+        os.replace(tmp_path, self.config_path)
+        self.saved = copy.deepcopy(self.config)
         print(f"Config file saved to {self.config_path}")
+        return True
@@ -0,0 +1,237 @@
+"""
+version: 1.0.1
+author: Wuyilingwei
+This module provides corpus-wide deduplication of pending source strings
+Entries with a `new` field that share the same normalized source text are
+grouped, so every unique string is translated only once and the result is
+fanned back into every mod data file that uses it
+Target utils version:
+file: 3.0.x
+"""
+import os
+import json
+import hashlib
+import logging
+import argparse
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import toml
+from .file import reorder_entry_fields
+from .reorder import reorder_toml_sections
+
+META_KEYS = ['_meta', 'name', 'field_prompt']
+
+
+def normalize_source(text: str) -> str:
+    """
+    Normalize source text for grouping
+    Only differences that never change the translation are folded:
+    unicode composition, line endings and surrounding whitespace
+    """
+    text = unicodedata.normalize('NFC', text)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text.strip()
+
+
+def source_id(normalized: str) -> str:
+    """Stable id of a normalized source string, used in work lists"""
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def _rewrap(original: str, translation: str) -> str:
+    """Re-apply the surrounding whitespace of one occurrence to the shared translation"""
+    core = original.strip()
+    if not core:
+        return translation
+    start = original.find(core)
+    return original[:start] + translation + original[start + len(core):]
+
+
+class SourceDeduplicator:
+    """
+    Group pending entries of all data files by normalized source text
+    """
+    data_path: str
+    groups: Dict[str, List[Tuple[str, str]]]
+    sources: Dict[str, str]
+    total_pending: int
+    logger: logging.Logger
+
+    def __init__(self, data_path: str) -> None:
+        self.data_path = data_path
+        self.groups = OrderedDict()
+        self.sources = {}
+        self.total_pending = 0
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def _data_files(self) -> List[str]:
+        if not os.path.isdir(self.data_path):
+            self.logger.error(f"Data path {self.data_path} does not exist")
+            return []
+        return sorted(f for f in os.listdir(self.data_path) if f.endswith('.toml'))
+
+    def _load(self, file_name: str) -> OrderedDict:
+        with open(os.path.join(self.data_path, file_name), 'r', encoding='utf-8') as f:
+            return toml.load(f, _dict=OrderedDict)
+
+    def scan(self) -> None:
+        """
+        Collect every entry with a `new` field, grouped by normalized source
+        """
+        self.groups = OrderedDict()
+        self.sources = {}
+        self.total_pending = 0
+        for file_name in self._data_files():
+            try:
+                data = self._load(file_name)
+            except Exception as e:
+                self.logger.error(f"Failed to load {file_name}: {e}")
+                continue
+            for key, entry in data.items():
+                if key in META_KEYS or not isinstance(entry, dict):
+                    continue
+                new_value = entry.get('new')
+                if not isinstance(new_value, str) or not new_value.strip():
+                    continue
+                normalized = normalize_source(new_value)
+                sid = source_id(normalized)
+                if sid not in self.groups:
+                    self.groups[sid] = []
+                    self.sources[sid] = normalized
+                self.groups[sid].append((file_name, key))
+                self.total_pending += 1
+        self.logger.info(self.summary())
+
+    @property
+    def unique_count(self) -> int:
+        return len(self.groups)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of pending entries that no longer need their own translation"""
+        if self.total_pending == 0:
+            return 0.0
+        return 1 - self.unique_count / self.total_pending
+
+    def summary(self) -> str:
+        return (f"{self.total_pending} pending entries -> {self.unique_count} unique strings "
+                f"(dedup ratio {self.dedup_ratio:.1%})")
+
+    def export_work_list(self, path: str) -> int:
+        """
+        Write one JSON line per unique source string
+        Returns the number of lines written
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for sid, occurrences in self.groups.items():
+                item = {
+                    'id': sid,
+                    'source': self.sources[sid],
+                    'count': len(occurrences),
+                    'mods': sorted({os.path.splitext(file_name)[0] for file_name, _ in occurrences}),
+                }
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self.logger.info(f"Work list with {self.unique_count} strings written to {path}")
+        return self.unique_count
+
+    def apply_translations(self, results: Dict[str, Dict[str, str]], target_lang: List[str]) -> int:
+        """
+        Fan translated strings back into every data file that uses them
+        results: source id -> {language code: translation}
+        target_lang: `new` is only promoted to `raw` when every target language is
+        translated, so a partial results file leaves the entry pending; new keys
+        (no `raw` yet) may cover a language with a translation shipped by the mod
+        Returns the number of entries updated
+        """
+        per_file: Dict[str, List[Tuple[str, str]]] = OrderedDict()
+        for sid, occurrences in self.groups.items():
+            if not results.get(sid):
+                continue
+            for file_name, key in occurrences:
+                per_file.setdefault(file_name, []).append((key, sid))
+
+        updated = 0
+        for file_name, items in per_file.items():
+            file_path = os.path.join(self.data_path, file_name)
+            try:
+                data = self._load(file_name)
+            except Exception as e:
+                self.logger.error(f"Failed to load {file_name}: {e}")
+                continue
+            file_updated = 0
+            for key, sid in items:
+                entry = data.get(key)
+                if not isinstance(entry, dict) or not isinstance(entry.get('new'), str):
+                    continue
+                # The file may have changed since the scan
+                if source_id(normalize_source(entry['new'])) != sid:
+                    self.logger.warning(f"Source of '{key}' in {file_name} changed since scan, skipping")
+                    continue
+                translations = results[sid]
+                # Language fields of a changed source are stale, those of a new key are shipped seeds
+                seeded = 'raw' not in entry
+                for lang, text in translations.items():
+                    entry[lang] = _rewrap(entry['new'], text)
+                if all(lang in translations or (seeded and entry.get(lang)) for lang in target_lang):
+                    entry['raw'] = entry.pop('new')
+                data[key] = reorder_entry_fields(entry)
+                file_updated += 1
+            if file_updated == 0:
+                continue
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(reorder_toml_sections(toml.dumps(data)))
+            updated += file_updated
+            self.logger.info(f"Applied {file_updated} translations to {file_name}")
+        self.logger.info(f"Applied translations to {updated} entries in {len(per_file)} files")
+        return updated
+
+
+def load_results(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Load translation results, one JSON line per string:
+    {"id": "<source id>", "translations": {"zhCN": "..."}}
+    """
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            results[item['id']] = item.get('translations', {})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deduplicate pending source strings across mods")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write the deduplicated work list")
+    export_parser.add_argument("data_dir")
+    export_parser.add_argument("output")
+    apply_parser = subparsers.add_parser("apply", help="Fan translated strings back into data files")
+    apply_parser.add_argument("data_dir")
+    apply_parser.add_argument("results")
+    apply_parser.add_argument("--config", default="config.toml",
+                              help="Config file providing translator.target_lang (default: config.toml)")
+    apply_parser.add_argument("--target-lang", nargs="*", default=None,
+                              help="Languages that must be translated before `new` is promoted to `raw`, "
+                                   "overrides the config")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    dedup = SourceDeduplicator(args.data_dir)
+    dedup.scan()
+    if args.command == "export":
+        dedup.export_work_list(args.output)
+    else:
+        target_lang = args.target_lang
+        if target_lang is None:
+            with open(args.config, 'r', encoding='utf-8') as f:
+                target_lang = toml.load(f)['translator']['target_lang']
+        dedup.apply_translations(load_results(args.results), target_lang)
+    print(dedup.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 """
-version: 3.0.0
+version: 3.5.3
 author: Wuyilingwei
 This module provides CSV file management
 This module is used to read and write CSV/TOML files
 For v3: Focus on data update with change detection, no translation
+Per-key details are only logged at DEBUG, every mod gets one summary line
+The keys changed by an update are recorded in CSV_File.changes for the run changeset
 Target utils version:
 None (standalone)
 """
@@ -12,7 +14,12 @@ import csv
 import toml
 import logging
 import re
-from collections import OrderedDict
+from collections import Counter, OrderedDict
+from .toml_cache import load_toml
+from .metrics import get_metrics
+
+# Kinds of key changes recorded per update for the run changeset
+CHANGE_KINDS = ('added', 'changed', 'abandoned', 'old')
 
 
 def reorder_entry_fields(entry: OrderedDict) -> OrderedDict:
@@ -52,6 +59,11 @@ class CSV_File:
         self.old_data = {}
         self.data = OrderedDict()
         self.new_raw_data = {}
+        self.seed_data = {}
+        self.merged_old_keys = set()  # keys merged from older versions this run, set by ModTarget
+        self.change_counts = Counter()
+        self.changes = {kind: [] for kind in CHANGE_KINDS}
+        self.raw_path = raw
         self.load_raw(raw)
 
     def is_valid_key(self, key: str) -> bool:
@@ -63,112 +75,148 @@ class CSV_File:
         # Building.NaturalOverhang1.Description, Knatte.Pillar_1.DisplayName
         return bool(re.match(r'^[A-Za-z0-9._]+$', key))
 
+    def _parse_csv(self, path: str) -> OrderedDict:
+        """Parse a localization CSV file into key -> text, skipping headers, comments and invalid keys"""
+        entries = OrderedDict()
+        skipped_separator = skipped_invalid = 0
+        metrics = get_metrics()
+        if metrics.enabled:
+            metrics.inc("files_read", kind="csv")
+            metrics.inc("bytes_read", os.path.getsize(path), kind="csv")
+        with open(path, 'r', encoding='utf-8') as file:
+            first_line = file.readline()
+            if first_line.startswith('\ufeff'):
+                first_line = first_line.lstrip('\ufeff')  # Remove BOM
+            reader = csv.reader([first_line] + file.readlines())
+            for row in reader:
+                if not row:
+                    continue
+                key = row[0]
+                # Skip header and comment rows
+                if key in ['id', 'ID']:
+                    continue
+                # Skip comment rows based on the Comment column
+                if len(row) > 2 and row[2].strip().lower() == 'comment':
+                    continue
+                # Skip keys containing '//' as they are used as separators
+                # Note: This checks for '//' anywhere in the key string
+                if '//' in key:
+                    skipped_separator += 1
+                    continue
+                # Skip keys with invalid characters (only allow A-Z, a-z, 0-9, _ and .)
+                if not self.is_valid_key(key):
+                    skipped_invalid += 1
+                    continue
+                if len(row) > 1:
+                    values = row[1:]
+                    entries[key] = values[0] if values[0] else ""
+        if skipped_separator or skipped_invalid:
+            self.logger.debug("Skipped %d separator keys containing '//' and %d keys with invalid characters in %s",
+                              skipped_separator, skipped_invalid, path)
+        return entries
+
     def load_raw(self, path: str) -> None:
         """Load raw CSV file from mod"""
         if path is None:
             self.logger.error("Cannot load raw data: path is None")
             return
         try:
-            with open(path, 'r', encoding='utf-8') as file:
-                first_line = file.readline()
-                if first_line.startswith('\ufeff'):
-                    first_line = first_line.lstrip('\ufeff')  # Remove BOM
-                reader = csv.reader([first_line] + file.readlines())
-                for row in reader:
-                    if not row:
-                        continue
-                    key = row[0]
-                    # Skip header and comment rows
-                    if key in ['id', 'ID']:
-                        continue
-                    # Skip comment rows based on the Comment column
-                    if len(row) > 2 and row[2].strip().lower() == 'comment':
-                        continue
-                    # Skip keys containing '//' as they are used as separators
-                    # Note: This checks for '//' anywhere in the key string
-                    if '//' in key:
-                        self.logger.debug(f"Skipping key '{key}' containing '//' (separator)")
-                        continue
-                    # Skip keys with invalid characters (only allow A-Z, a-z, and .)
-                    if not self.is_valid_key(key):
-                        self.logger.debug(f"Skipping key '{key}' with invalid characters (only A-Z, a-z, . allowed)")
-                        continue
-                    if len(row) > 1:
-                        values = row[1:]
-                        self.new_raw_data[key] = values[0] if values[0] else ""
-            self.logger.info(f"Loaded {len(self.new_raw_data)} entries from {path}")
+            self.new_raw_data = self._parse_csv(path)
+            self.logger.info("Loaded %d entries from %s", len(self.new_raw_data), path)
         except FileNotFoundError:
-            self.logger.error(f"File not found: {path}")
+            self.logger.error("File not found: %s", path)
+        except Exception as e:
+            self.logger.error("Error loading data from %s: %s", path, e)
+
+    def load_seed(self, lang: str, path: str) -> None:
+        """
+        Load a translation shipped by the mod author for one language
+        Used to pre-fill empty language fields in update_data
+        """
+        try:
+            self.seed_data[lang] = self._parse_csv(path)
+            self.logger.info("Loaded %d %s seed entries from %s", len(self.seed_data[lang]), lang, path)
         except Exception as e:
-            self.logger.error(f"Error loading data from {path}: {e}")
+            self.logger.error("Error loading %s seed data from %s: %s", lang, path, e)
 
     def load_old_data(self, path: str) -> None:
         """Load existing TOML file if it exists"""
         try:
             if os.path.exists(path):
-                with open(path, 'r', encoding='utf-8') as file:
-                    self.old_data = toml.load(file, _dict=OrderedDict)
-                self.logger.info(f"Loaded old data from {path}")
+                self.old_data = load_toml(path)
+                self.logger.info("Loaded old data from %s", path)
             else:
-                self.logger.info(f"No existing data file found: {path}")
+                self.logger.info("No existing data file found: %s", path)
                 self.old_data = OrderedDict()
         except Exception as e:
-            self.logger.error(f"Error loading old data from {path}: {e}")
+            self.logger.error("Error loading old data from %s: %s", path, e)
             self.old_data = OrderedDict()
 
-    def save_data(self, path: str, filename: str) -> None:
-        """Save updated data to TOML file"""
+    def save_data(self, path: str, filename: str) -> bool:
+        """
+        Save updated data to TOML file
+        The file is only rewritten when its content changes, so unchanged files
+        keep their mtime and stay valid in the parsed-TOML cache
+        Returns True if the file was written
+        """
         try:
             if not os.path.exists(path):
                 os.makedirs(path)
             file_path = os.path.join(path, f"{filename}.toml")
-            with open(file_path, 'w', encoding='utf-8') as file:
-                toml.dump(self.data, file)
-            self.logger.info(f"Saved data to {file_path}")
-            
+            content = toml.dumps(self.data)
+
             # Perform round-trip comparison for keys with 'new' field
-            self._remove_identical_new_values(file_path)
-            
+            content = self._remove_identical_new_values(content, file_path)
+
             # Apply TOML section reordering to ensure _meta is at the front
-            self._reorder_toml_sections(file_path)
-            
+            content = self._reorder_toml_sections(content, file_path)
+
+            if os.path.exists(file_path):
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    if file.read() == content:
+                        self.logger.info("Data unchanged, kept %s", file_path)
+                        return False
+            with open(file_path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            metrics = get_metrics()
+            if metrics.enabled:
+                metrics.inc("files_written", kind="toml")
+                metrics.inc("bytes_written", len(content.encode('utf-8')), kind="toml")
+            self.logger.info("Saved data to %s", file_path)
+            return True
+
         except Exception as e:
-            self.logger.error(f"Error saving data to {file_path}: {e}")
+            self.logger.error("Error saving data to %s: %s", file_path, e)
+            return False
     
-    def _reorder_toml_sections(self, file_path: str) -> None:
+    def _reorder_toml_sections(self, toml_content: str, file_path: str) -> str:
         """
-        重新排序TOML文件，确保_meta section在最前面
+        重新排序TOML内容，确保_meta section在最前面
         """
         try:
             from .reorder import reorder_toml_sections
             
-            # 读取文件内容
-            with open(file_path, 'r', encoding='utf-8') as file:
-                toml_content = file.read()
-            
             # 重新排序
             reordered_content = reorder_toml_sections(toml_content)
             
-            # 如果内容有变化，重新写入文件
             if reordered_content != toml_content:
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    file.write(reordered_content)
-                self.logger.info(f"Reordered TOML sections in {file_path} (_meta sections moved to front)")
+                self.logger.debug("Reordered TOML sections in %s (_meta sections moved to front)", file_path)
+            return reordered_content
             
         except Exception as e:
-            self.logger.warning(f"Failed to reorder TOML sections in {file_path}: {e}")
+            self.logger.warning("Failed to reorder TOML sections in %s: %s", file_path, e)
+            return toml_content
     
-    def _remove_identical_new_values(self, file_path: str) -> None:
+    def _remove_identical_new_values(self, toml_content: str, file_path: str) -> str:
         """
-        Read back the saved TOML file and compare 'new' and 'raw' values.
+        Read back the dumped TOML content and compare 'new' and 'raw' values.
         If they are identical after TOML round-trip, remove the 'new' field.
         """
         try:
-            # Read back the file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                saved_data = toml.load(file, _dict=OrderedDict)
+            # Read back the content
+            saved_data = toml.loads(toml_content, _dict=OrderedDict)
             
-            modified = False
+            removed = 0
             for key in saved_data:
                 if key == '_meta':
                     continue
@@ -177,16 +225,16 @@ class CSV_File:
                     # Compare after round-trip
                     if entry['new'] == entry['raw']:
                         del entry['new']
-                        modified = True
-                        self.logger.info(f"Removed 'new' field for key '{key}': identical to 'raw' after TOML round-trip")
-            
-            # Save back if modified
-            if modified:
-                with open(file_path, 'w', encoding='utf-8') as file:
-                    toml.dump(saved_data, file)
-                self.logger.info(f"Updated {file_path} after round-trip comparison")
+                        removed += 1
+
+            # Dump again if modified
+            if removed:
+                self.logger.info("Removed %d 'new' fields identical to 'raw' after TOML round-trip in %s",
+                                 removed, file_path)
+                return toml.dumps(saved_data)
         except Exception as e:
-            self.logger.error(f"Error in round-trip comparison for {file_path}: {e}")
+            self.logger.error("Error in round-trip comparison for %s: %s", file_path, e)
+        return toml_content
 
     def update_data(self) -> None:
         """
@@ -197,9 +245,16 @@ class CSV_File:
         - For unchanged keys: keep as-is
         - Preserve 'prompt' fields in individual entries
         - If data acquisition fails (empty new_raw_data), preserve existing _meta completely
+        Keys are recorded in self.changes: added, changed (source text differs from the
+        stored 'new' or 'raw'), abandoned (newly dropped from the raw data) and old
+        (newly merged from older versions, see merged_old_keys); everything else is only counted
         """
         self.data = OrderedDict()
-        
+        self.change_counts = Counter()
+        self.changes = {kind: [] for kind in CHANGE_KINDS}
+        # Per-key lines are built only when DEBUG is enabled, full rebuilds touch every key
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+
         # Handle _meta section for metadata
         if '_meta' in self.old_data and isinstance(self.old_data['_meta'], dict):
             # Start with existing _meta data to preserve all subfields
@@ -221,16 +276,17 @@ class CSV_File:
                 pass
         else:
             # Data acquisition failed, keep existing _meta as-is
-            self.logger.info(f"Data acquisition failed for mod {self.id}, preserving existing _meta fields")
+            self.logger.info("Data acquisition failed for mod %s, preserving existing _meta fields", self.id)
         
         # If data acquisition failed (no new raw data), preserve all existing data
         if len(self.new_raw_data) == 0:
-            self.logger.warning(f"No new raw data for mod {self.id}, preserving all existing data")
+            self.logger.warning("No new raw data for mod %s, preserving all existing data", self.id)
             # Copy all existing data (except what we've already handled in _meta)
             for key in self.old_data:
                 if key not in ['name', 'field_prompt'] and key not in self.data:
                     self.data[key] = self.old_data[key]
-                    self.logger.debug(f"Preserved existing key '{key}' due to data acquisition failure")
+                    self.change_counts['preserved'] += 1
+            self._log_changes()
             return  # Skip all processing since we have no new data
         
         # Process each key from raw data
@@ -261,20 +317,29 @@ class CSV_File:
                     
                     # Reorder fields: raw, new, status, language codes
                     self.data[key] = reorder_entry_fields(temp_entry)
-                    
-                    self.logger.info(f"Updated key '{key}': value changed from '{old_raw}' to '{new_value}'")
+                    # A key still waiting for retranslation of the same text is no change
+                    if old_entry.get('new', old_raw) == new_value:
+                        self.change_counts['pending'] += 1
+                    else:
+                        self.changes['changed'].append(key)
+                        if debug:
+                            self.logger.debug("Updated key '%s': value changed from '%s' to '%s'",
+                                              key, old_raw, new_value)
                 else:
                     # Value unchanged - keep as-is, but ensure status and reorder fields
                     temp_entry = old_entry.copy()
                     if 'status' not in temp_entry:
                         temp_entry['status'] = 'normal'
                     self.data[key] = reorder_entry_fields(temp_entry)
+                    self.change_counts['unchanged'] += 1
             else:
                 # New key - create with 'new' field and status
                 self.data[key] = OrderedDict()
                 self.data[key]['new'] = new_value
                 self.data[key]['status'] = 'normal'
-                self.logger.info(f"New key '{key}' added with value '{new_value}'")
+                self.changes['added'].append(key)
+                if debug:
+                    self.logger.debug("New key '%s' added with value '%s'", key, new_value)
         
         # Preserve keys from old data that are not in new raw data
         # Set status field based on whether key was from older version
@@ -283,17 +348,64 @@ class CSV_File:
                 old_entry = self.old_data[key]
                 if isinstance(old_entry, dict):
                     # Check if this key already has status "old" (from older version)
-                    if old_entry.get('status') != 'old':
+                    if old_entry.get('status') == 'abandoned':
+                        self.data[key] = reorder_entry_fields(old_entry)
+                        self.change_counts['unchanged'] += 1
+                    elif old_entry.get('status') != 'old':
                         # This key was in the latest version but no longer exists in raw data
                         # Set status to "abandoned"
                         entry_copy = OrderedDict(old_entry)
                         entry_copy['status'] = 'abandoned'
                         self.data[key] = reorder_entry_fields(entry_copy)
-                        self.logger.info(f"Key '{key}' status: abandoned (no longer in raw data)")
+                        self.changes['abandoned'].append(key)
+                        if debug:
+                            self.logger.debug("Key '%s' status: abandoned (no longer in raw data)", key)
                     else:
                         # This key was from an older version, keep as-is with status "old"
                         self.data[key] = reorder_entry_fields(old_entry)
-                        self.logger.debug(f"Preserved old key '{key}' from older version (status: old)")
+                        if key in self.merged_old_keys:
+                            self.changes['old'].append(key)
+                        else:
+                            self.change_counts['unchanged'] += 1
                 else:
                     self.data[key] = old_entry
-                    self.logger.debug(f"Preserved key '{key}' (not in new raw data)")
+                    self.change_counts['preserved'] += 1
+
+        self._apply_seed()
+        self._log_changes()
+
+    def _log_changes(self) -> None:
+        """One summary line per mod instead of one line per key, counters go to the run metrics"""
+        counts = self.change_counts
+        counts.update({kind: len(keys) for kind, keys in self.changes.items()})
+        self.logger.info("Mod %s: %d new, %d changed, %d pending, %d unchanged, %d abandoned, %d old, "
+                         "%d preserved keys", self.id, counts['added'], counts['changed'], counts['pending'],
+                         counts['unchanged'], counts['abandoned'], counts['old'], counts['preserved'])
+        metrics = get_metrics()
+        if metrics.enabled:
+            for change, count in counts.items():
+                metrics.inc("keys", count, change=change)
+
+    def _apply_seed(self) -> None:
+        """
+        Fill empty language fields with translations shipped by the mod
+        Seeds identical to the source text are skipped, mods often ship untranslated copies
+        Entries whose source text changed ('new' next to a stored 'raw') are skipped, their
+        translations are redone anyway; new keys have no 'raw' and are seeded
+        """
+        if not self.seed_data:
+            return
+        seeded = 0
+        for key, entry in self.data.items():
+            if key == '_meta' or not isinstance(entry, dict) or entry.get('status') == 'abandoned' \
+                    or ('new' in entry and 'raw' in entry):
+                continue
+            source = entry.get('new', entry.get('raw', ''))
+            for lang, seed in self.seed_data.items():
+                text = seed.get(key)
+                if not text or text == source or entry.get(lang):
+                    continue
+                entry[lang] = text
+                seeded += 1
+        if seeded > 0:
+            self.logger.info("Seeded %d translations for mod %s from shipped language files", seeded, self.id)
@@ -1,48 +1,131 @@
 """
-version: 1.0.0
+version: 1.1.0
 author: Wuyilingwei
 This module provides git actions
 This module is used to push and pull git repository
+Only the paths written by the pipeline are staged, empty commits are skipped
+and pulls are a fetch plus fast-forward merge
 """
 import os
 import logging
 import subprocess
+from typing import Iterable, List, Optional
+
+# Paths per `git add` call, keeps the command line below the OS limit
+ADD_BATCH_SIZE = 500
+# Per-file lines listed in a generated commit message
+MESSAGE_FILE_LIMIT = 50
+
 
 class Git:
     """
     Git class to handle git operations
     """
-    def __init__(self, repo_path: str,branch: str) -> None:
+    def __init__(self, repo_path: str, branch: str, remote: str = "origin", depth: Optional[int] = None) -> None:
         """
         Initialize the Git class with the repository path
+        depth: fetch depth for shallow clones, None fetches the full history
         """
         self.repo_path = repo_path
+        self.branch = branch
+        self.remote = remote
+        self.depth = depth
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    def push(self) -> None:
+    def _run(self, args: List[str], check: bool = True) -> subprocess.CompletedProcess:
+        return subprocess.run(['git'] + args, cwd=self.repo_path, check=check,
+                              capture_output=True, text=True, encoding='utf-8')
+
+    def _fetch(self) -> None:
+        args = ['fetch', '--quiet', self.remote, self.branch]
+        if self.depth:
+            args[2:2] = [f'--depth={self.depth}']
+        self._run(args)
+
+    def _stage(self, paths: Iterable[str]) -> int:
+        rel_paths = sorted({os.path.relpath(os.path.abspath(path), os.path.abspath(self.repo_path))
+                            for path in paths})
+        for i in range(0, len(rel_paths), ADD_BATCH_SIZE):
+            # -A also stages deletions of the given paths
+            self._run(['add', '-A', '--'] + rel_paths[i:i + ADD_BATCH_SIZE])
+        return len(rel_paths)
+
+    def summarize_staged(self) -> str:
         """
-        Push changes to the remote repository
+        Commit message for the staged changes, one line per changed file
+        """
+        lines = []
+        total_added = total_removed = 0
+        for row in self._run(['diff', '--cached', '--numstat']).stdout.splitlines():
+            added, removed, path = row.split('\t', 2)
+            # Binary files report "-"
+            added = int(added) if added.isdigit() else 0
+            removed = int(removed) if removed.isdigit() else 0
+            total_added += added
+            total_removed += removed
+            lines.append(f"{os.path.splitext(os.path.basename(path))[0]}: +{added} -{removed}")
+        subject = f"Update {len(lines)} mods (+{total_added} -{total_removed} lines)"
+        if len(lines) > MESSAGE_FILE_LIMIT:
+            lines = lines[:MESSAGE_FILE_LIMIT] + [f"... and {len(lines) - MESSAGE_FILE_LIMIT} more"]
+        return subject + "\n\n" + "\n".join(lines)
+
+    def push(self, paths: Optional[Iterable[str]] = None, message: Optional[str] = None,
+             retries: int = 2) -> bool:
+        """
+        Commit and push changes to the remote repository
+        paths: files written by the pipeline, None stages the whole work tree
+        message: commit message, generated from the staged changes if None
+        A rejected push is rebased onto the remote branch and retried
+        Returns True if a commit was pushed
         """
         try:
-            self.logger.info("Pushing changes to remote repository")
-            subprocess.run(['git', 'add', '.'], cwd=self.repo_path, check=True)
-            subprocess.run(['git', 'commit', '-m', 'Update'], cwd=self.repo_path, check=True)
-            subprocess.run(['git', 'push'], cwd=self.repo_path, check=True)
-            self.logger.info("Changes pushed successfully")
+            if paths is None:
+                self._run(['add', '-A'])
+            else:
+                self.logger.info(f"Staged {self._stage(paths)} paths")
+            if self._run(['diff', '--cached', '--quiet'], check=False).returncode == 0:
+                self.logger.info("No changes to commit, skipping push")
+                return False
+
+            message = message or self.summarize_staged()
+            self._run(['commit', '--quiet', '-m', message])
+            self.logger.info(f"Committed: {message.splitlines()[0]}")
+
+            for attempt in range(retries + 1):
+                result = self._run(['push', '--quiet', self.remote, f"HEAD:{self.branch}"], check=False)
+                if result.returncode == 0:
+                    self.logger.info("Changes pushed successfully")
+                    return True
+                if attempt == retries:
+                    break
+                self.logger.warning(f"Push rejected, rebasing onto {self.remote}/{self.branch}: "
+                                    f"{result.stderr.strip()}")
+                self._fetch()
+                rebase = self._run(['rebase', '--quiet', 'FETCH_HEAD'], check=False)
+                if rebase.returncode != 0:
+                    self._run(['rebase', '--abort'], check=False)
+                    self.logger.error(f"Rebase failed, commit kept locally: {rebase.stderr.strip()}")
+                    return False
+            self.logger.error(f"Error pushing changes: {result.stderr.strip()}")
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Error pushing changes: {e}")
+            self.logger.error(f"Error pushing changes: {e} {e.stderr.strip() if e.stderr else ''}")
         except Exception as e:
             self.logger.error(f"Unexpected error: {e}")
+        return False
 
-    def pull(self) -> None:
+    def pull(self) -> bool:
         """
-        Pull changes from the remote repository
+        Fetch and fast-forward to the remote branch
+        Returns True if the working tree is up to date with the remote
         """
         try:
             self.logger.info("Pulling changes from remote repository")
-            subprocess.run(['git', 'pull'], cwd=self.repo_path, check=True)
+            self._fetch()
+            self._run(['merge', '--ff-only', '--quiet', 'FETCH_HEAD'])
             self.logger.info("Changes pulled successfully")
+            return True
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Error pulling changes: {e}")
+            self.logger.error(f"Error pulling changes: {e} {e.stderr.strip() if e.stderr else ''}")
         except Exception as e:
-            self.logger.error(f"Unexpected error: {e}")
\ No newline at end of file
+            self.logger.error(f"Unexpected error: {e}")
+        return False
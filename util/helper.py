@@ -1,11 +1,11 @@
 """
-version: 1.0.0
+version: 1.2.0
 author: Wuyilingwei
 This module provides helper functions
 """
 import os
+import re
 import logging
-from util.translator import *
 def search_versions(path: str) -> list[str]:
     """
     Search for all versions in the given path
@@ -71,4 +71,43 @@ def search_file(path: str, versions: list[str], keyword = "en") -> dict[str, str
     if len(result) == 0:
         logger.error(f"ERROR: {path} not found")
         return None
-    return result
\ No newline at end of file
+    return result
+
+LANGUAGE_CODE_PATTERN = re.compile(r'(?<![A-Za-z])([a-z]{2}[A-Z]{2})(?![A-Za-z])')
+
+
+def search_language_files(path: str, versions: list[str]) -> dict[str, dict[str, str]]:
+    """
+    Index every localization file a mod ships, per version
+    Returns {version: {language code: file path}}, e.g. {"version-0.7": {"zhCN": ".../zhCN.csv"}}
+    The language code is taken from the file name (enUS.csv, zhCN_MyMod.csv, ...)
+    If not multiple versions, the files are listed under default
+    """
+    logger = logging.getLogger(__name__)
+    def index_helper(path: str) -> dict[str, str]:
+        languages = {}
+        for root, dirs, files in os.walk(path):
+            for file in sorted(files):
+                if not (file.endswith('.csv') or file.endswith('.txt')):
+                    continue
+                match = LANGUAGE_CODE_PATTERN.search(os.path.splitext(file)[0])
+                if not match or match.group(1) in languages:
+                    continue
+                file_path = os.path.join(root, file)
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        firstline = f.readline().strip()
+                except (OSError, UnicodeDecodeError) as e:
+                    logger.debug(f"Cannot read {file_path}: {e}")
+                    continue
+                if 'ID,Text,Comment' in firstline:
+                    languages[match.group(1)] = file_path
+        return languages
+    result = {}
+    for version in versions:
+        if os.path.exists(os.path.join(path, version)):
+            result[version] = index_helper(os.path.join(path, version))
+    if not result:
+        result["default"] = index_helper(path)
+    logger.debug(f"Found language files: {result}")
+    return result
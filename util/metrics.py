@@ -0,0 +1,173 @@
+"""
+version: 1.0.0
+author: Wuyilingwei
+This module provides lightweight run instrumentation
+Timers for pipeline steps, per-mod spans and counters, exported as JSON or
+as a Prometheus textfile; when disabled a null object keeps the overhead to
+one attribute lookup and an empty context manager
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Tuple
+
+PROMETHEUS_PREFIX = "timberborn"
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, object]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """
+    Collect timers, spans and counters of one run
+    timer: named durations, e.g. one per pipeline step
+    span: per-mod durations, aggregated per name and kept as records for JSON
+    counter: monotonically increasing values, e.g. files and bytes written
+    """
+    enabled = True
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.timers: Dict[LabelKey, float] = {}
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.span_records: List[dict] = []
+        self.counters: Dict[LabelKey, float] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record a duration measured elsewhere as a timer"""
+        key = _key(name, labels)
+        with self.lock:
+            self.timers[key] = self.timers.get(key, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def span(self, name: str, mod: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                stats = self.spans.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+                stats["count"] += 1
+                stats["sum"] += seconds
+                stats["max"] = max(stats["max"], seconds)
+                self.span_records.append({"span": name, "mod": mod, "seconds": seconds})
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "duration": time.time() - self.started_at,
+                "timers": [{"name": name, "labels": dict(labels), "seconds": seconds}
+                           for (name, labels), seconds in self.timers.items()],
+                "spans": {name: dict(stats) for name, stats in self.spans.items()},
+                "span_records": list(self.span_records),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in self.counters.items()],
+            }
+
+    def export_json(self, path: str) -> None:
+        _write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=1))
+
+    def export_prometheus(self, path: str) -> None:
+        """Write a textfile for the node_exporter textfile collector"""
+        lines = []
+        with self.lock:
+            timer_names = sorted({name for name, _ in self.timers})
+            for name in timer_names:
+                metric = f"{PROMETHEUS_PREFIX}_{name}_seconds"
+                lines.append(f"# TYPE {metric} gauge")
+                for (key_name, labels), seconds in sorted(self.timers.items()):
+                    if key_name == name:
+                        lines.append(f"{metric}{_format_labels(labels)} {seconds:.6f}")
+            if self.spans:
+                metric = f"{PROMETHEUS_PREFIX}_mod_span_seconds"
+                lines.append(f"# TYPE {metric} summary")
+                for name, stats in sorted(self.spans.items()):
+                    labels = _format_labels((("span", name),))
+                    lines.append(f"{metric}_sum{labels} {stats['sum']:.6f}")
+                    lines.append(f"{metric}_count{labels} {stats['count']}")
+                lines.append(f"# TYPE {metric}_max gauge")
+                for name, stats in sorted(self.spans.items()):
+                    lines.append(f"{metric}_max{_format_labels((('span', name),))} {stats['max']:.6f}")
+            counter_names = sorted({name for name, _ in self.counters})
+            for name in counter_names:
+                metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (key_name, labels), value in sorted(self.counters.items()):
+                    if key_name == name:
+                        lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_start_timestamp_seconds gauge")
+            lines.append(f"{PROMETHEUS_PREFIX}_run_start_timestamp_seconds {self.started_at:.0f}")
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+
+class NullMetrics:
+    """
+    Drop-in replacement used when instrumentation is disabled
+    """
+    enabled = False
+    _context = nullcontext()
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        pass
+
+    def timer(self, name: str, **labels) -> nullcontext:
+        return self._context
+
+    def span(self, name: str, mod: str) -> nullcontext:
+        return self._context
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+
+def _write_atomic(path: str, content: str) -> None:
+    # The textfile collector may read at any time, never expose a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+_metrics = NullMetrics()
+
+
+def configure(enabled: bool):
+    """Enable or disable the process-wide metrics, returns the active object"""
+    global _metrics
+    _metrics = Metrics() if enabled else NullMetrics()
+    return _metrics
+
+
+def get_metrics():
+    return _metrics
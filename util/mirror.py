@@ -0,0 +1,204 @@
+"""
+version: 1.1.0
+author: Wuyilingwei
+This module provides an indexed SQLite mirror of the data repository
+The TOML files stay the source of truth; the mirror holds one row per mod,
+per entry and per translated language so questions like key ownership or
+language coverage are answered without parsing every data file
+Files are re-read only when their size or mtime changed
+"""
+import os
+import sys
+import sqlite3
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+from .toml_cache import load_toml
+from .helper import LANGUAGE_CODE_PATTERN
+
+META_KEYS = ['_meta', 'name', 'field_prompt']
+# Bumped when the mirrored content changes meaning, older mirrors are resynced from scratch
+MIRROR_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mods (
+    mod_id TEXT PRIMARY KEY,
+    name TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    key_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keys (
+    mod_id TEXT NOT NULL REFERENCES mods(mod_id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    raw TEXT,
+    new TEXT,
+    status TEXT,
+    PRIMARY KEY (mod_id, key)
+);
+CREATE TABLE IF NOT EXISTS translations (
+    mod_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (mod_id, key, lang),
+    FOREIGN KEY (mod_id, key) REFERENCES keys(mod_id, key) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_keys_key ON keys(key);
+CREATE INDEX IF NOT EXISTS idx_keys_status ON keys(status);
+CREATE INDEX IF NOT EXISTS idx_translations_lang ON translations(lang, mod_id);
+"""
+
+
+class DataMirror:
+    """
+    SQLite mirror of git/data/*.toml
+    """
+    db_path: str
+    connection: sqlite3.Connection
+    logger: logging.Logger
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.logger = logging.getLogger(self.__class__.__name__)
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != MIRROR_VERSION:
+            # Version 1 stored per-entry fields such as prompt as languages
+            with self.connection:
+                self.connection.execute("DELETE FROM mods")
+            self.connection.execute(f"PRAGMA user_version = {MIRROR_VERSION}")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "DataMirror":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def sync_file(self, mod_id: str, path: str, force: bool = False) -> bool:
+        """
+        Mirror one data file, skipped if size and mtime match the mirrored copy
+        Returns True if the mirror was updated
+        """
+        stat = os.stat(path)
+        if not force:
+            row = self.connection.execute("SELECT size, mtime_ns FROM mods WHERE mod_id = ?", (mod_id,)).fetchone()
+            if row == (stat.st_size, stat.st_mtime_ns):
+                return False
+        data = load_toml(path)
+
+        meta = data.get('_meta') if isinstance(data.get('_meta'), dict) else {}
+        name = meta.get('name', data.get('name'))
+        key_rows = []
+        translation_rows = []
+        for key, entry in data.items():
+            if key in META_KEYS or not isinstance(entry, dict):
+                continue
+            key_rows.append((mod_id, key, entry.get('raw'), entry.get('new'), entry.get('status')))
+            # Only language codes are translations, entries also carry raw/new/status and prompt
+            for field, value in entry.items():
+                if LANGUAGE_CODE_PATTERN.fullmatch(field) and isinstance(value, str) and value:
+                    translation_rows.append((mod_id, key, field, value))
+
+        with self.connection:
+            # Cascades to keys and translations
+            self.connection.execute("DELETE FROM mods WHERE mod_id = ?", (mod_id,))
+            self.connection.execute("INSERT INTO mods VALUES (?, ?, ?, ?, ?)",
+                                    (mod_id, name, stat.st_size, stat.st_mtime_ns, len(key_rows)))
+            self.connection.executemany("INSERT INTO keys VALUES (?, ?, ?, ?, ?)", key_rows)
+            self.connection.executemany("INSERT INTO translations VALUES (?, ?, ?, ?)", translation_rows)
+        self.logger.debug(f"Mirrored {mod_id}: {len(key_rows)} keys, {len(translation_rows)} translations")
+        return True
+
+    def remove_mod(self, mod_id: str) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM mods WHERE mod_id = ?", (mod_id,))
+
+    def sync_dir(self, data_path: str, force: bool = False) -> Tuple[int, int]:
+        """
+        Mirror every data file and drop mods whose file is gone
+        Returns (updated, removed)
+        """
+        files = {f[:-len('.toml')]: os.path.join(data_path, f)
+                 for f in os.listdir(data_path) if f.endswith('.toml')}
+        updated = 0
+        for mod_id, path in sorted(files.items()):
+            try:
+                if self.sync_file(mod_id, path, force):
+                    updated += 1
+            except Exception as e:
+                self.logger.error(f"Failed to mirror {path}: {e}")
+        removed = [row[0] for row in self.connection.execute("SELECT mod_id FROM mods")
+                   if row[0] not in files]
+        for mod_id in removed:
+            self.remove_mod(mod_id)
+        self.logger.info(f"Mirror synced: {updated} updated, {len(removed)} removed, {len(files)} data files")
+        return updated, len(removed)
+
+    def rebuild(self, data_path: str) -> Tuple[int, int]:
+        """Drop the mirrored content and resync it from the data files"""
+        with self.connection:
+            self.connection.execute("DELETE FROM mods")
+        self.connection.execute("VACUUM")
+        return self.sync_dir(data_path, force=True)
+
+    def mod_keys(self, mod_id: str) -> List[str]:
+        return [row[0] for row in self.connection.execute(
+            "SELECT key FROM keys WHERE mod_id = ? ORDER BY key", (mod_id,))]
+
+    def key_owners(self, key: str) -> List[str]:
+        return [row[0] for row in self.connection.execute(
+            "SELECT mod_id FROM keys WHERE key = ? ORDER BY mod_id", (key,))]
+
+    def coverage(self, mod_id: Optional[str] = None) -> Dict[str, Tuple[int, int]]:
+        """
+        Translated entries per language, abandoned entries excluded
+        Returns {lang: (translated, total)}
+        """
+        where = "k.status IS NOT 'abandoned'" + (" AND k.mod_id = ?" if mod_id else "")
+        params = (mod_id,) if mod_id else ()
+        total = self.connection.execute(f"SELECT COUNT(*) FROM keys k WHERE {where}", params).fetchone()[0]
+        rows = self.connection.execute(
+            f"SELECT t.lang, COUNT(*) FROM translations t JOIN keys k USING (mod_id, key) "
+            f"WHERE {where} GROUP BY t.lang ORDER BY t.lang", params)
+        return {lang: (count, total) for lang, count in rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain and query the SQLite mirror of the data repository")
+    parser.add_argument("db", help="Mirror database path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("sync", "Mirror changed data files"), ("rebuild", "Resync the mirror from scratch")):
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument("data_dir", help="Data directory, e.g. git/data")
+    subparsers.add_parser("coverage", help="Translated entries per language").add_argument("mod_id", nargs="?")
+    subparsers.add_parser("owners", help="Mods that define a key").add_argument("key")
+    subparsers.add_parser("keys", help="Keys of a mod").add_argument("mod_id")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    with DataMirror(args.db) as mirror:
+        if args.command == "sync":
+            mirror.sync_dir(args.data_dir)
+        elif args.command == "rebuild":
+            mirror.rebuild(args.data_dir)
+        elif args.command == "coverage":
+            for lang, (translated, total) in mirror.coverage(args.mod_id).items():
+                print(f"{lang}\t{translated}/{total}\t{translated / total:.1%}" if total else f"{lang}\t0/0")
+        elif args.command == "owners":
+            print("\n".join(mirror.key_owners(args.key)))
+        else:
+            print("\n".join(mirror.mod_keys(args.mod_id)))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,23 +5,26 @@ Only keeps the latest version, merging unique keys from older versions
 """
 import os
 import logging
-import toml
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from collections import OrderedDict
 from .file import CSV_File, reorder_entry_fields
+from .mirror import DataMirror
+from .toml_cache import load_toml
 
 logger = logging.getLogger(__name__)
 
 class ModTarget:
     """管理单个mod的单版本数据更新，合并旧版本的独立键值对"""
     
-    def __init__(self, mod_id: str, mod_name: str, mod_path: str):
+    def __init__(self, mod_id: str, mod_name: str, mod_path: str, seed_languages: Optional[List[str]] = None):
         self.mod_id = mod_id
         self.mod_name = mod_name
         self.mod_path = mod_path
+        self.seed_languages = seed_languages  # None: seed every shipped language
         self.versions: Dict[str, CSV_File] = {}
         self.version_priority: List[str] = []
         self.old_version_data: Dict[str, OrderedDict] = {}  # 存储所有旧版本数据用于合并
+        self.merged_old_keys: Set[str] = set()  # 本次从旧版本合并进来的键
         
     def add_version(self, version: str, raw_file_path: str) -> bool:
         """添加版本和对应的原始文件"""
@@ -39,6 +42,23 @@ class ModTarget:
             logger.error(f"Failed to add version {version} for mod {self.mod_id}: {e}")
             return False
     
+    def add_seed_files(self, version: str, language_files: Dict[str, str]) -> int:
+        """为版本加载mod自带的其他语言文件，用于预填空的翻译字段，返回加载的语言数"""
+        csv_file = self.versions.get(version)
+        if csv_file is None:
+            return 0
+        loaded = 0
+        for lang, path in language_files.items():
+            if self.seed_languages is not None and lang not in self.seed_languages:
+                continue
+            if os.path.abspath(path) == os.path.abspath(csv_file.raw_path):
+                continue
+            csv_file.load_seed(lang, path)
+            loaded += 1
+        if loaded > 0:
+            logger.info(f"Loaded {loaded} shipped language files for mod {self.mod_id} version {version}")
+        return loaded
+
     def _update_version_priority(self, new_version: str):
         """更新版本优先级：最高版本>最低版本>default"""
         if new_version in self.version_priority:
@@ -73,8 +93,7 @@ class ModTarget:
         old_data_file = os.path.join(data_path, f"{self.mod_id}.toml")
         if os.path.exists(old_data_file):
             try:
-                with open(old_data_file, 'r', encoding='utf-8') as f:
-                    self.old_version_data['single'] = toml.load(f, _dict=OrderedDict)
+                self.old_version_data['single'] = load_toml(old_data_file)
                 logger.info(f"Loaded old single-file data for {self.mod_id}")
             except Exception as e:
                 msg = f"Failed to load old single-file data for {self.mod_id} from {old_data_file}: {e}"
@@ -86,8 +105,7 @@ class ModTarget:
             old_data_file = os.path.join(data_path, f"{self.mod_id}_{version}.toml")
             if os.path.exists(old_data_file):
                 try:
-                    with open(old_data_file, 'r', encoding='utf-8') as f:
-                        self.old_version_data[version] = toml.load(f, _dict=OrderedDict)
+                    self.old_version_data[version] = load_toml(old_data_file)
                     logger.info(f"Loaded old data for {self.mod_id} version {version}")
                 except Exception as e:
                     msg = f"Failed to load old data for {self.mod_id} version {version} from {old_data_file}: {e}"
@@ -114,6 +132,7 @@ class ModTarget:
         merged_old_data = self._merge_old_version_data()
         if merged_old_data:
             latest_csv.old_data = merged_old_data
+        latest_csv.merged_old_keys = self.merged_old_keys
         
         # Update the latest version data
         logger.info(f"Updating data for mod {self.mod_id} with latest version {latest_version}")
@@ -125,6 +144,7 @@ class ModTarget:
     def _merge_old_version_data(self) -> OrderedDict:
         """合并所有旧版本数据：以最新版本为基础，添加旧版本的独立键值对并标记"""
         merged = OrderedDict()
+        self.merged_old_keys = set()
         
         # Start with single-file format if it exists (use OrderedDict constructor for proper copying)
         if 'single' in self.old_version_data:
@@ -177,6 +197,7 @@ class ModTarget:
                             # Reorder fields: raw, new, status, language codes
                             merged_value = reorder_entry_fields(merged_value)
                         merged[key] = merged_value
+                        self.merged_old_keys.add(key)
                         added_count += 1
                 
                 if added_count > 0:
@@ -184,18 +205,32 @@ class ModTarget:
         
         return merged
     
-    def save_all_data(self, data_path: str):
-        """保存单个版本的数据（不带版本后缀）"""
+    def latest_changes(self) -> Dict[str, List[str]]:
+        """最新版本上次更新的键变化，见 CSV_File.changes"""
+        if not self.version_priority or self.version_priority[0] not in self.versions:
+            return {}
+        return self.versions[self.version_priority[0]].changes
+
+    def save_all_data(self, data_path: str, mirror: Optional[DataMirror] = None) -> bool:
+        """保存单个版本的数据（不带版本后缀），提供 mirror 时同步到 SQLite 镜像，返回文件是否被写入"""
         if not self.version_priority:
             logger.warning(f"No versions to save for mod {self.mod_id}")
-            return
+            return False
         
         # Only save the latest version as a single file
         latest_version = self.version_priority[0]
         if latest_version in self.versions:
             csv_file = self.versions[latest_version]
-            csv_file.save_data(data_path, f"{self.mod_id}")
+            written = csv_file.save_data(data_path, f"{self.mod_id}")
             logger.info(f"Saved data for mod {self.mod_id} (latest version: {latest_version})")
+            if mirror is not None:
+                try:
+                    mirror.sync_file(self.mod_id, os.path.join(data_path, f"{self.mod_id}.toml"))
+                except Exception as e:
+                    # The mirror is derived data, a rebuild recovers it
+                    logger.error(f"Failed to mirror data for mod {self.mod_id}: {e}")
+            return written
+        return False
     
     def has_valid_versions(self) -> bool:
         """检查是否有有效的版本"""
@@ -0,0 +1,112 @@
+"""
+version: 1.1.0
+author: Wuyilingwei
+This module provides a per-step profiling mode for the update tool
+Every step gets a cProfile dump and a tracemalloc snapshot with its peak
+memory; a short top-N hotspot summary is written for quick comparison
+Only the calling thread is profiled
+cProfile and pstats are imported by StepProfiler, NullProfiler keeps start-up light
+"""
+import io
+import os
+import time
+import logging
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List
+
+
+class StepProfiler:
+    """
+    Profile pipeline steps into out_dir as step-<name>.prof and step-<name>.tracemalloc
+    """
+    out_dir: str
+    top_n: int
+    steps: Dict[str, dict]
+    filters: List[tracemalloc.Filter]
+    logger: logging.Logger
+
+    def __init__(self, out_dir: str, top_n: int = 15) -> None:
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self.steps = {}
+        self.logger = logging.getLogger(self.__class__.__name__)
+        import cProfile
+        import pstats
+        # Allocations of the profilers themselves are left out of the snapshots
+        self.filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+        ]
+        os.makedirs(out_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start_snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - start
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+
+            prof_path = os.path.join(self.out_dir, f"step-{name}.prof")
+            profile.dump_stats(prof_path)
+            snapshot.dump(os.path.join(self.out_dir, f"step-{name}.tracemalloc"))
+
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(self.top_n)
+            # Growth during the step, not everything allocated since start-up
+            allocations = [str(stat) for stat in snapshot.compare_to(start_snapshot, "lineno")[:self.top_n]]
+            self.steps[name] = {
+                "seconds": seconds,
+                "peak_memory": peak_memory - start_memory,
+                "retained_memory": current_memory - start_memory,
+                "hotspots": stream.getvalue(),
+                "allocations": allocations,
+            }
+            self.logger.info(f"Profiled step {name}: {seconds:.2f}s, "
+                             f"peak {(peak_memory - start_memory) / 1024 / 1024:.1f} MiB, dump {prof_path}")
+
+    def write_summary(self, path: str) -> None:
+        """Write the per-step overview followed by the top-N hotspots and allocations"""
+        lines: List[str] = [f"{'step':<6}{'seconds':>10}{'peak MiB':>12}{'retained MiB':>15}"]
+        for name, step in self.steps.items():
+            lines.append(f"{name:<6}{step['seconds']:>10.2f}{step['peak_memory'] / 1024 / 1024:>12.1f}"
+                         f"{step['retained_memory'] / 1024 / 1024:>15.1f}")
+        for name, step in self.steps.items():
+            lines.append("")
+            lines.append(f"===== Step {name}: top {self.top_n} by cumulative time =====")
+            # Drop the pstats preamble up to the column header
+            hotspots = step["hotspots"].splitlines()
+            header = next((i for i, line in enumerate(hotspots) if line.lstrip().startswith("ncalls")), 0)
+            lines.extend(line for line in hotspots[header:] if line.strip())
+            lines.append(f"----- Step {name}: top {self.top_n} allocation changes -----")
+            lines.extend(step["allocations"])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.logger.info(f"Profile summary written to {path}")
+
+
+class NullProfiler:
+    """
+    Drop-in replacement used when profiling is disabled
+    """
+    _context = nullcontext()
+
+    def step(self, name: str) -> nullcontext:
+        return self._context
+
+    def write_summary(self, path: str) -> None:
+        pass
@@ -0,0 +1,157 @@
+"""
+version: 1.1.0
+author: Wuyilingwei
+This module provides the registry of tracked workshop mods
+Replaces the workshop.ids / blacklist_ids lists of config.toml with a JSON
+file holding per-mod status and timestamps (first seen, last updated, last
+processed); membership checks are dict lookups and the file is only written,
+atomically, when something changed
+"""
+import os
+import json
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+REGISTRY_FORMAT = 1
+REGISTRY_FILE = "mod_registry.json"
+
+STATUS_ACTIVE = "active"
+STATUS_INVALID = "invalid"
+STATUS_BLACKLISTED = "blacklisted"
+STATUSES = (STATUS_ACTIVE, STATUS_INVALID, STATUS_BLACKLISTED)
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class ModRegistry:
+    """
+    Tracked mods keyed by mod id, in the order they were first seen
+    active: processed every run; invalid: not downloaded or without localization,
+    retried when the workshop lists it again; blacklisted: never processed
+    """
+    path: str
+    mods: Dict[str, dict]
+    exists: bool
+    dirty: bool
+    logger: logging.Logger
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.mods = {}
+        self.dirty = False
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.exists = os.path.exists(path)
+        if self.exists:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != REGISTRY_FORMAT:
+                raise ValueError(f"Unsupported registry format {data.get('format')!r} in {path}")
+            self.mods = data["mods"]
+            self.logger.info(f"Loaded {len(self.mods)} mods from {path}")
+
+    def __contains__(self, mod_id: str) -> bool:
+        return str(mod_id) in self.mods
+
+    def __len__(self) -> int:
+        return len(self.mods)
+
+    def status(self, mod_id: str) -> Optional[str]:
+        entry = self.mods.get(str(mod_id))
+        return entry["status"] if entry else None
+
+    def ids(self, status: str = STATUS_ACTIVE) -> List[str]:
+        return [mod_id for mod_id, entry in self.mods.items() if entry["status"] == status]
+
+    def seed(self, ids: Iterable[str], blacklist_ids: Iterable[str] = ()) -> None:
+        """Import the id lists of config.toml, used when there is no registry file yet"""
+        for mod_id in ids:
+            self.add(mod_id)
+        self.blacklist(blacklist_ids)
+        self.logger.info(f"Seeded registry with {len(self.ids())} active and "
+                         f"{len(self.ids(STATUS_BLACKLISTED))} blacklisted mods from config")
+
+    def add(self, mod_id: str) -> bool:
+        """
+        Track a mod found on the workshop
+        Returns True if it was unknown or invalid and is active now
+        """
+        mod_id = str(mod_id)
+        entry = self.mods.get(mod_id)
+        if entry is None:
+            self.mods[mod_id] = {"status": STATUS_ACTIVE, "first_seen": _now(),
+                                 "last_updated": None, "last_processed": None}
+            self.dirty = True
+            return True
+        if entry["status"] == STATUS_INVALID:
+            self.set_status(mod_id, STATUS_ACTIVE)
+            return True
+        return False
+
+    def set_status(self, mod_id: str, status: str) -> None:
+        if status not in STATUSES:
+            raise ValueError(f"Unknown mod status {status!r}")
+        mod_id = str(mod_id)
+        entry = self.mods.get(mod_id)
+        if entry is None:
+            self.mods[mod_id] = {"status": status, "first_seen": _now(),
+                                 "last_updated": None, "last_processed": None}
+            self.dirty = True
+        elif entry["status"] != status:
+            entry["status"] = status
+            self.dirty = True
+
+    def blacklist(self, ids: Iterable[str]) -> List[str]:
+        """Blacklist mods, returns the ids whose status changed"""
+        changed = [str(mod_id) for mod_id in ids if self.status(mod_id) != STATUS_BLACKLISTED]
+        for mod_id in changed:
+            self.set_status(mod_id, STATUS_BLACKLISTED)
+        return changed
+
+    def sync_blacklist(self, ids: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        Make the blacklisted mods exactly the given ids, the blacklist_ids of config.toml
+        Mods no longer listed become active again and are retried like new mods
+        Returns (newly blacklisted ids, ids taken off the blacklist)
+        """
+        ids = {str(mod_id) for mod_id in ids}
+        released = [mod_id for mod_id in self.ids(STATUS_BLACKLISTED) if mod_id not in ids]
+        for mod_id in released:
+            self.set_status(mod_id, STATUS_ACTIVE)
+        return self.blacklist(sorted(ids)), released
+
+    def mark_processed(self, mod_id: str, updated: bool = False) -> None:
+        """
+        Record a Step 4 run of a mod, updated: its data file changed
+        Only an update marks the registry dirty, last_processed alone is written with the next change
+        """
+        entry = self.mods[str(mod_id)]
+        entry["last_processed"] = _now()
+        if updated:
+            entry["last_updated"] = entry["last_processed"]
+            self.dirty = True
+
+    def to_dict(self) -> dict:
+        return {"format": REGISTRY_FORMAT, "mods": self.mods}
+
+    def save(self) -> bool:
+        """Write the registry if it changed, returns True if the file was written"""
+        if not self.dirty:
+            self.logger.info(f"Registry unchanged, kept {self.path}")
+            return False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+        self.exists = True
+        self.logger.info(f"Registry saved to {self.path}: {len(self.ids())} active, "
+                         f"{len(self.ids(STATUS_INVALID))} invalid, "
+                         f"{len(self.ids(STATUS_BLACKLISTED))} blacklisted mods")
+        return True
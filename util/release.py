@@ -1,21 +1,214 @@
 """
-version: 0.1.0 Alpha
+version: 0.2.0 Alpha
 author: Wuyilingwei
 This module provides release functions for mods
 This module is used to release mods to Steam Workshop and GitHub
-! THIS MODULE IS INCOMPLETE !
-This module will rewrite to steamcmd and github release module
 Transfer from scripts.sh
 """
 import os
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import argparse
 import subprocess
 import shutil
+import time
 import zipfile
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Fixed entry timestamp, identical content gives an identical archive
+ARCHIVE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Already compressed formats are stored as-is
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".zip", ".gz", ".7z"}
+ZIP32_LIMIT = 0xFFFFFFFF
+
+
+# Files excluded from the content manifest: manifest.json only carries the version number
+CONTENT_MANIFEST_EXCLUDE = {"manifest.json"}
+
+
+def build_content_manifest(root: str) -> dict[str, str]:
+    """
+    Hash every file of a release tree
+    Returns {relative path: sha256}
+    """
+    manifest = {}
+    for dir_path, dirs, files in os.walk(root):
+        dirs.sort()
+        for file in sorted(files):
+            if file in CONTENT_MANIFEST_EXCLUDE:
+                continue
+            file_path = os.path.join(dir_path, file)
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            manifest[os.path.relpath(file_path, root).replace(os.sep, "/")] = digest.hexdigest()
+    return manifest
+
+
+def diff_content_manifests(old: dict[str, str], new: dict[str, str]) -> dict[str, list[str]]:
+    """Compare two content manifests"""
+    return {
+        "added": sorted(path for path in new if path not in old),
+        "changed": sorted(path for path in new if path in old and old[path] != new[path]),
+        "removed": sorted(path for path in old if path not in new),
+    }
+
+
+def summarize_content_diff(diff: dict[str, list[str]], limit: int = 10) -> str:
+    """Short human-readable summary of a content diff, used in changenotes"""
+    lines = [f"{len(diff['added'])} files added, {len(diff['changed'])} changed, {len(diff['removed'])} removed"]
+    for kind in ("added", "changed", "removed"):
+        paths = diff[kind]
+        if not paths:
+            continue
+        shown = ", ".join(os.path.basename(path) for path in paths[:limit])
+        more = f" (+{len(paths) - limit} more)" if len(paths) > limit else ""
+        lines.append(f"{kind.capitalize()}: {shown}{more}")
+    return "\n".join(lines)
+
+
+def load_content_manifest(state_dir: str):
+    """Content manifest of the last published release, None if there is none"""
+    path = os.path.join(state_dir, "last.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_content_manifest(state_dir: str, manifest: dict[str, str], version=None) -> None:
+    """Store the content manifest of a published release as last.json and <version>.json"""
+    os.makedirs(state_dir, exist_ok=True)
+    names = ["last.json"] + ([f"{version}.json"] if version else [])
+    for name in names:
+        tmp_path = os.path.join(state_dir, f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, os.path.join(state_dir, name))
+
+
+def _same_file(src_stat: os.stat_result, dst_path: str, src_path: str, compare: str) -> bool:
+    """Decide whether dst_path already holds the content of src_path"""
+    try:
+        dst_stat = os.stat(dst_path)
+    except FileNotFoundError:
+        return False
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if compare == "size":
+        return True
+    if compare == "mtime":
+        return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+    with open(src_path, "rb") as src, open(dst_path, "rb") as dst:
+        while True:
+            src_chunk = src.read(1 << 20)
+            if src_chunk != dst.read(1 << 20):
+                return False
+            if not src_chunk:
+                return True
+
+
+def sync_tree(sources: dict[str, str], dest: str, compare: str = "mtime") -> dict[str, int]:
+    """
+    rsync-style sync of dest to exactly the given files
+    sources: {relative path in dest: source file}
+    compare: "mtime" (size and mtime), "size" or "hash" (size and content)
+    Only new or changed files are copied, files not in sources are deleted
+    Returns statistics including the number of bytes actually written
+    """
+    stats = {"copied": 0, "unchanged": 0, "deleted": 0, "bytes_written": 0}
+    os.makedirs(dest, exist_ok=True)
+    wanted = set()
+    for rel_path, src_path in sorted(sources.items()):
+        dst_path = os.path.join(dest, *rel_path.split("/"))
+        wanted.add(os.path.normpath(dst_path))
+        src_stat = os.stat(src_path)
+        if _same_file(src_stat, dst_path, src_path, compare):
+            stats["unchanged"] += 1
+            continue
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        # Replace instead of writing in place, dst may be a hardlink shared with other files
+        tmp_path = f"{dst_path}.sync-tmp"
+        shutil.copy2(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+        stats["copied"] += 1
+        stats["bytes_written"] += src_stat.st_size
+
+    for dir_path, dirs, files in os.walk(dest, topdown=False):
+        for file in files:
+            file_path = os.path.normpath(os.path.join(dir_path, file))
+            if file_path not in wanted:
+                os.remove(file_path)
+                stats["deleted"] += 1
+        if dir_path != dest and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+    return stats
+
+
+def _compress_entry(path: str, compress: bool, level: int) -> tuple[bytes, int, int]:
+    """Read a file and return (payload, crc32, uncompressed size), payload is raw deflate if compress"""
+    with open(path, "rb") as f:
+        data = f.read()
+    crc = zlib.crc32(data)
+    if not compress:
+        return data, crc, len(data)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(), crc, len(data)
+
+
+class _ZipWriter:
+    """
+    Minimal sequential zip writer for entries compressed elsewhere
+    zipfile can only compress on the writing thread, so headers are written with struct;
+    the fields match what zipfile writes on a Unix host. No ZIP64: releases stay far below 4 GiB
+    """
+    def __init__(self, fp):
+        self.fp = fp
+        self.offset = 0
+        self.central = []
+        year, month, day, hour, minute, second = ARCHIVE_DATE_TIME
+        self.dos_date = (year - 1980) << 9 | month << 5 | day
+        self.dos_time = hour << 11 | minute << 5 | second // 2
+
+    def _write(self, data: bytes) -> None:
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def add(self, arcname: str, payload: bytes, crc: int, size: int, compressed: bool) -> None:
+        try:
+            name = arcname.encode("ascii")
+            flags = 0
+        except UnicodeEncodeError:
+            name = arcname.encode("utf-8")
+            flags = 0x800
+        method = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+        if max(size, len(payload), self.offset) > ZIP32_LIMIT or len(self.central) >= 0xFFFF:
+            raise ValueError(f"Release archive needs ZIP64 at {arcname}, which is not supported")
+        self.central.append(struct.pack(
+            "<4s4B4HL2L5H2L", b"PK\x01\x02", 20, 3, 20, 0, flags, method, self.dos_time, self.dos_date,
+            crc, len(payload), size, len(name), 0, 0, 0, 0, 0o644 << 16, self.offset) + name)
+        self._write(struct.pack(
+            "<4s2B4HL2L2H", b"PK\x03\x04", 20, 0, flags, method, self.dos_time, self.dos_date,
+            crc, len(payload), size, len(name), 0) + name)
+        self._write(payload)
+
+    def close(self) -> None:
+        start = self.offset
+        for header in self.central:
+            self._write(header)
+        self._write(struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, len(self.central), len(self.central),
+                                self.offset - start, start, 0))
 
 
 class Releaser:
-    def __init__(self, base_dir, app_id, published_file_id, repo_owner, repo_name):
+    def __init__(self, base_dir, app_id, published_file_id, repo_owner, repo_name,
+                 steamcmd_path=None, gh_path="gh"):
         self.base_dir = base_dir
         self.git_dir = os.path.join(base_dir, "git")
         self.steamcmd_dir = os.path.join(base_dir, "steam")
@@ -24,10 +217,18 @@ class Releaser:
         self.context_dir = os.path.join(self.git_dir, "mod")
         self.manifest_file = os.path.join(self.mod_info_dir, "manifest.json")
         self.versions_file = os.path.join(self.git_dir, "versions.txt")
+        self.content_state_dir = os.path.join(self.mod_info_dir, "release_manifests")
+        # How prepare_release detects unchanged files: "mtime", "size" or "hash"
+        self.sync_compare = "mtime"
         self.app_id = app_id
         self.published_file_id = published_file_id
+        self.repo_owner = repo_owner
+        self.repo_name = repo_name
+        # Executables are configurable so the publish stage can run against stand-ins
+        self.steamcmd_path = steamcmd_path or os.path.join(self.steamcmd_dir, "steamcmd.sh")
+        self.gh_path = gh_path
+        self.publish_results = {}
         self.logger = logging.getLogger(self.__class__.__name__)
-        raise NotImplementedError("This class is not fully implemented yet.")
 
     def update_version(self, overwrite=False):
         if not os.path.exists(self.manifest_file):
@@ -68,27 +269,78 @@ class Releaser:
 
         self.logger.info(f"All game versions: {versions}")
 
-        if os.path.exists(self.release_dir):
-            shutil.rmtree(self.release_dir)
-        os.makedirs(self.release_dir, exist_ok=True)
-
-        # Copy common files
-        shutil.copytree(self.context_dir, self.release_dir, dirs_exist_ok=True)
+        sources = {}
+        for root, _, files in os.walk(self.context_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                sources[os.path.relpath(file_path, self.context_dir).replace(os.sep, "/")] = file_path
         for file_name in ["thumbnail.png", "workshop_data.json", "License.txt", "joinus.txt"]:
             src = os.path.join(self.mod_info_dir, file_name)
             if os.path.exists(src):
-                shutil.copy(src, self.release_dir)
+                sources[file_name] = src
+        for version in versions:
+            sources[f"{version}/manifest.json"] = self.manifest_file
 
-        # Copy version-specific files
+        stats = sync_tree(sources, self.release_dir, self.sync_compare)
+        self.logger.info(f"Synced release directory: {stats['copied']} copied, {stats['unchanged']} unchanged, "
+                         f"{stats['deleted']} deleted, {stats['bytes_written']} bytes written")
+        return versions
+
+    def copy_version_files(self, versions):
+        """Copy version-specific files (manifest.json) into every version folder"""
         for version in versions:
             version_dir = os.path.join(self.release_dir, version)
             os.makedirs(version_dir, exist_ok=True)
-            shutil.copy(self.manifest_file, version_dir)
+            # copy2 keeps the mtime, so the next sync sees the file as unchanged
+            shutil.copy2(self.manifest_file, version_dir)
 
-        return versions
+    def build_archive(self, zip_path, workers=None, level=6):
+        """
+        Zip release_dir without a temporary copy
+        Entries are sorted and carry a fixed timestamp, so identical content gives
+        identical bytes; files are compressed in parallel, images are stored
+        """
+        entries = []
+        for root, dirs, files in os.walk(self.release_dir):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                arcname = os.path.relpath(file_path, self.release_dir).replace(os.sep, "/")
+                compress = os.path.splitext(file)[1].lower() not in STORED_EXTENSIONS
+                entries.append((file_path, arcname, compress))
+
+        workers = workers or min(8, os.cpu_count() or 1)
+        total_size = 0
+        with open(zip_path, "wb") as fp, ThreadPoolExecutor(max_workers=workers) as executor:
+            writer = _ZipWriter(fp)
+            # Bounded look-ahead keeps memory use independent of the release size
+            pending = deque()
+            entry_iter = iter(entries)
+            for file_path, arcname, compress in entry_iter:
+                pending.append((arcname, compress, executor.submit(_compress_entry, file_path, compress, level)))
+                if len(pending) >= workers * 4:
+                    break
+            while pending:
+                arcname, compress, future = pending.popleft()
+                payload, crc, size = future.result()
+                total_size += size
+                writer.add(arcname, payload, crc, size, compress)
+                next_entry = next(entry_iter, None)
+                if next_entry is not None:
+                    file_path, next_arcname, next_compress = next_entry
+                    pending.append((next_arcname, next_compress,
+                                    executor.submit(_compress_entry, file_path, next_compress, level)))
+            writer.close()
 
-    def upload_to_steam(self, new_version):
+        self.logger.info(f"Created release archive {zip_path} with {len(entries)} files "
+                         f"({total_size} bytes -> {os.path.getsize(zip_path)} bytes)")
+        return zip_path
+
+    def upload_to_steam(self, new_version, change_summary=""):
         changenote = f"Automated Updates {new_version or 'unknown'}"
+        if change_summary:
+            # The changenote is a quoted VDF value
+            changenote += "\n" + change_summary.replace('"', "'")
         vdf_path = os.path.join(self.steamcmd_dir, "workshop.vdf")
         with open(vdf_path, "w", encoding="utf-8") as f:
             f.write(
@@ -105,39 +357,30 @@ class Releaser:
 
         self.logger.info("Uploading to Steam Workshop...")
         subprocess.run(
-            [os.path.join(self.steamcmd_dir, "steamcmd.sh"), "+workshop_build_item", vdf_path, "+quit"],
+            [self.steamcmd_path, "+workshop_build_item", vdf_path, "+quit"],
             check=True,
         )
         self.logger.info("Steam Workshop upload completed.")
 
-    def upload_to_github(self, new_version):
+    def upload_to_github(self, new_version, change_summary="", release_zip=None):
         git_tag = f"v{new_version}"
         self.logger.info(f"Creating Git tag: {git_tag}")
         subprocess.run(["git", "tag", git_tag], cwd=self.git_dir, check=True)
         subprocess.run(["git", "push", "origin", git_tag], cwd=self.git_dir, check=True)
 
-        # Create release archive
-        tmp_folder = os.path.join(self.base_dir, "Timberborn_Mods_Universal_Translate_Github")
-        if os.path.exists(tmp_folder):
-            shutil.rmtree(tmp_folder)
-        shutil.copytree(self.release_dir, tmp_folder)
-
-        release_zip = os.path.join(self.base_dir, f"{new_version}.zip")
-        with zipfile.ZipFile(release_zip, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(tmp_folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, tmp_folder)
-                    zipf.write(file_path, arcname)
-
-        shutil.rmtree(tmp_folder)
+        # Create release archive straight from the release directory, unless the publish stage built it
+        own_zip = release_zip is None
+        if own_zip:
+            release_zip = self.build_archive(os.path.join(self.base_dir, f"{new_version}.zip"))
 
         # Create GitHub release
         release_notes = f"Automated Update to {new_version}"
+        if change_summary:
+            release_notes += f"\n\n```\n{change_summary}\n```"
         self.logger.info(f"Creating GitHub Release {git_tag}...")
         subprocess.run(
             [
-                "gh",
+                self.gh_path,
                 "release",
                 "create",
                 git_tag,
@@ -151,18 +394,105 @@ class Releaser:
             ],
             check=True,
         )
-        os.remove(release_zip)
+        if own_zip:
+            os.remove(release_zip)
         self.logger.info(f"GitHub Release {git_tag} created.")
 
-    def run(self, overwrite=False, push_steam=True, push_github=True):
+    def publish(self, new_version, change_summary="", push_steam=True, push_github=True):
+        """
+        Upload the prepared release to every enabled target concurrently
+        The archive is built once up front; a failing target does not stop the others
+        Returns {target: {"ok": bool, "duration": seconds, "error": str}}, also kept in publish_results
+        """
+        release_zip = None
+        if push_github:
+            release_zip = self.build_archive(os.path.join(self.base_dir, f"{new_version}.zip"))
+        targets = {}
+        if push_steam:
+            targets["steam"] = lambda: self.upload_to_steam(new_version, change_summary)
+        if push_github:
+            targets["github"] = lambda: self.upload_to_github(new_version, change_summary, release_zip)
+
+        def timed(upload):
+            start = time.perf_counter()
+            try:
+                upload()
+                return {"ok": True, "duration": time.perf_counter() - start, "error": ""}
+            except Exception as e:
+                return {"ok": False, "duration": time.perf_counter() - start, "error": str(e)}
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(targets))) as executor:
+                futures = {name: executor.submit(timed, upload) for name, upload in targets.items()}
+                self.publish_results = {name: future.result() for name, future in futures.items()}
+        finally:
+            if release_zip and os.path.exists(release_zip):
+                os.remove(release_zip)
+
+        for name, result in self.publish_results.items():
+            if result["ok"]:
+                self.logger.info(f"Publish to {name} succeeded in {result['duration']:.1f}s")
+            else:
+                self.logger.error(f"Publish to {name} failed after {result['duration']:.1f}s: {result['error']}")
+        return self.publish_results
+
+    def run(self, overwrite=False, push_steam=True, push_github=True, force=False):
+        """
+        Prepare and publish a release
+        Publishing is skipped when the release content is identical to the last
+        published release, unless force is set
+        """
         self.logger.info("Starting release process...")
-        new_version = self.update_version(overwrite)
         versions = self.prepare_release()
 
-        if push_steam:
-            self.upload_to_steam(new_version)
+        content_manifest = build_content_manifest(self.release_dir)
+        last_manifest = load_content_manifest(self.content_state_dir)
+        diff = diff_content_manifests(last_manifest or {}, content_manifest)
+        if last_manifest is not None and not any(diff.values()) and not force:
+            self.logger.info("Release content unchanged since last release, skipping publish.")
+            return None
+        change_summary = summarize_content_diff(diff)
+        self.logger.info(f"Release changes: {change_summary}")
+
+        new_version = self.update_version(overwrite)
+        # manifest.json carries the new version number
+        self.copy_version_files(versions)
+
+        results = self.publish(new_version, change_summary, push_steam, push_github)
+        failed = [name for name, result in results.items() if not result["ok"]]
+        if failed:
+            # Keep the previous content manifest, so the next run publishes again
+            raise RuntimeError(f"Publish failed for: {', '.join(failed)}")
+
+        save_content_manifest(self.content_state_dir, content_manifest, new_version)
+        self.logger.info("Release process completed.")
+        return new_version
+
+
+def main() -> int:
+    """
+    Content manifest helpers for script.sh
+    check: exit 0 and print the change summary if release_dir differs from the last release, exit 3 if not
+    save: record release_dir as the last published release
+    """
+    parser = argparse.ArgumentParser(description="Release content manifest helpers")
+    parser.add_argument("command", choices=["check", "save"])
+    parser.add_argument("release_dir")
+    parser.add_argument("state_dir", help="Directory holding the content manifests of published releases")
+    parser.add_argument("--version", default=None, help="Release version, stored as <version>.json by save")
+    args = parser.parse_args()
+
+    manifest = build_content_manifest(args.release_dir)
+    if args.command == "save":
+        save_content_manifest(args.state_dir, manifest, args.version)
+        return 0
+    last_manifest = load_content_manifest(args.state_dir)
+    diff = diff_content_manifests(last_manifest or {}, manifest)
+    print(summarize_content_diff(diff))
+    if last_manifest is not None and not any(diff.values()):
+        return 3
+    return 0
 
-        if push_github:
-            self.upload_to_github(new_version)
 
-        self.logger.info("Release process completed.")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
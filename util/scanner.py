@@ -0,0 +1,240 @@
+"""
+version: 1.0.1
+author: Wuyilingwei
+This module provides a fast pending-work scanner for the data repository
+It streams entries that need translation (a `new` field or missing target
+languages) without fully parsing every TOML file
+Files written by toml.dump are read with a line scanner, anything else falls
+back to toml.load; an optional index caches results by file size and mtime
+"""
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+import toml
+
+META_KEYS = ['_meta', 'name', 'field_prompt']
+# Bumped whenever pending_items changes, cached items of older indexes are discarded
+INDEX_FORMAT = 2
+
+_HEADER_RE = re.compile(r'^\[\s*("(?:[^"\\]|\\.)*"|[A-Za-z0-9_.-]+)\s*\]$')
+_ASSIGN_RE = re.compile(r'^("(?:[^"\\]|\\.)*"|[A-Za-z0-9_-]+)\s*=\s*"((?:[^"\\]|\\.)*)"$')
+_ESCAPE_RE = re.compile(r'\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|[btnfr"\\])')
+_ESCAPES = {'b': '\b', 't': '\t', 'n': '\n', 'f': '\f', 'r': '\r', '"': '"', '\\': '\\'}
+
+
+class ScanFallback(Exception):
+    """Raised when a file uses TOML syntax the line scanner does not handle"""
+
+
+def _unescape(value: str) -> str:
+    if '\\' not in value:
+        return value
+    def replace(match: re.Match) -> str:
+        seq = match.group(1)
+        if seq[0] in 'uU':
+            return chr(int(seq[1:], 16))
+        return _ESCAPES[seq]
+    unescaped = _ESCAPE_RE.sub(replace, value)
+    if '\\' in _ESCAPE_RE.sub('', value):
+        raise ScanFallback(f"Unsupported escape in {value!r}")
+    return unescaped
+
+
+def _unquote_key(key: str) -> str:
+    if key.startswith('"'):
+        return _unescape(key[1:-1])
+    return key
+
+
+def scan_entries(text: str) -> "OrderedDict[str, Dict[str, str]]":
+    """
+    Parse the entry tables of a data file written by toml.dump
+    Only string fields of top-level entries are returned, _meta is skipped
+    Raises ScanFallback on anything unexpected
+    """
+    entries = OrderedDict()
+    current = None
+    skip_table = True
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('['):
+            match = _HEADER_RE.match(line)
+            if not match:
+                raise ScanFallback(f"Unsupported table header {line!r}")
+            raw_key = match.group(1)
+            if raw_key == '_meta' or raw_key.startswith('_meta.'):
+                skip_table = True
+                continue
+            if not raw_key.startswith('"') and '.' in raw_key:
+                raise ScanFallback(f"Nested table {line!r}")
+            key = _unquote_key(raw_key)
+            skip_table = key in META_KEYS
+            current = entries.setdefault(key, OrderedDict())
+            continue
+        if skip_table:
+            # _meta content and top-level metadata may hold any value type
+            continue
+        match = _ASSIGN_RE.match(line)
+        if not match:
+            # Multi-line, literal or non-string values
+            raise ScanFallback(f"Unsupported line {line!r}")
+        current[_unquote_key(match.group(1))] = _unescape(match.group(2))
+    return entries
+
+
+def load_entries(path: str) -> "OrderedDict[str, Dict[str, str]]":
+    """
+    Load the entry tables of a data file, scanning when possible
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        return scan_entries(text)
+    except ScanFallback as e:
+        logging.getLogger(__name__).debug(f"Falling back to toml.load for {path}: {e}")
+    data = toml.loads(text, _dict=OrderedDict)
+    entries = OrderedDict()
+    for key, entry in data.items():
+        if key in META_KEYS or not isinstance(entry, dict):
+            continue
+        entries[key] = OrderedDict((k, v) for k, v in entry.items() if isinstance(v, str))
+    return entries
+
+
+def pending_items(mod_id: str, entries: Dict[str, Dict[str, str]],
+                  target_lang: List[str]) -> List[dict]:
+    """
+    Turn the entries of one mod into pending work items
+    Entries whose source changed (`new` next to `raw`) need every target language,
+    others only the missing ones; new keys may be pre-filled with shipped translations
+    """
+    items = []
+    for key, entry in entries.items():
+        if entry.get('status') == 'abandoned':
+            continue
+        has_new = 'new' in entry
+        source = entry['new'] if has_new else entry.get('raw', '')
+        if not source:
+            continue
+        if has_new and 'raw' in entry:
+            missing = list(target_lang)
+        else:
+            missing = [lang for lang in target_lang if not entry.get(lang)]
+        if not missing:
+            continue
+        items.append({'mod_id': mod_id, 'key': key, 'source': source,
+                      'missing': missing, 'new': has_new})
+    return items
+
+
+class PendingScanner:
+    """
+    Stream pending work items of all data files
+    """
+    data_path: str
+    target_lang: List[str]
+    index_path: Optional[str]
+    index: Dict[str, dict]
+    logger: logging.Logger
+
+    def __init__(self, data_path: str, target_lang: List[str], index_path: Optional[str] = None) -> None:
+        self.data_path = data_path
+        self.target_lang = list(target_lang)
+        self.index_path = index_path
+        self.index = {}
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            # Cached items depend on the target languages and the pending rules
+            if index.get('format') == INDEX_FORMAT and index.get('target_lang') == self.target_lang:
+                self.index = index.get('files', {})
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable index {self.index_path}: {e}")
+
+    def save_index(self) -> None:
+        if not self.index_path:
+            return
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': INDEX_FORMAT, 'target_lang': self.target_lang, 'files': self.index}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def scan(self) -> Iterator[dict]:
+        """
+        Yield pending work items, mod by mod in file name order
+        """
+        if not os.path.isdir(self.data_path):
+            self.logger.error(f"Data path {self.data_path} does not exist")
+            return
+        files = sorted((e for e in os.scandir(self.data_path) if e.name.endswith('.toml') and e.is_file()),
+                       key=lambda e: e.name)
+        seen = set()
+        hits = 0
+        for dir_entry in files:
+            seen.add(dir_entry.name)
+            stat = dir_entry.stat()
+            fingerprint = [stat.st_size, stat.st_mtime_ns]
+            cached = self.index.get(dir_entry.name)
+            if cached and cached['fingerprint'] == fingerprint:
+                hits += 1
+                items = cached['items']
+            else:
+                mod_id = dir_entry.name[:-len('.toml')]
+                try:
+                    items = pending_items(mod_id, load_entries(dir_entry.path), self.target_lang)
+                except Exception as e:
+                    self.logger.error(f"Failed to scan {dir_entry.path}: {e}")
+                    continue
+                if self.index_path:
+                    self.index[dir_entry.name] = {'fingerprint': fingerprint, 'items': items}
+            yield from items
+        for name in list(self.index):
+            if name not in seen:
+                del self.index[name]
+        self.logger.info(f"Scanned {len(files)} data files ({hits} from index)")
+        self.save_index()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream pending translation work from the data repository as JSONL")
+    parser.add_argument("data_dir", help="Data directory, e.g. git/data")
+    parser.add_argument("--config", default="config.toml",
+                        help="Config file providing translator.target_lang (default: config.toml)")
+    parser.add_argument("--target-lang", nargs="*", default=None,
+                        help="Target languages, overrides the config")
+    parser.add_argument("--index", default=None, help="Path of the cached scan index")
+    parser.add_argument("--output", default=None, help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    target_lang = args.target_lang
+    if target_lang is None:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            target_lang = toml.load(f)['translator']['target_lang']
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for item in PendingScanner(args.data_dir, target_lang, args.index).scan():
+            out.write(json.dumps(item, ensure_ascii=False) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+version: 1.2.1
+author: Wuyilingwei
+This module provides sharding of the mod list across several hosts
+Mods are assigned to shards by a stable hash of their id, every shard run
+writes its data files and a shard.json into its own directory, and merge
+combines all shards into the canonical data directory and mod registry
+Target utils version:
+config: 1.1.x
+changeset: 1.0.x
+registry: 1.1.x
+"""
+import os
+import json
+import shutil
+import filecmp
+import hashlib
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+from .config import Config
+from .changeset import CHANGESET_FILE, merge_changesets
+from .registry import ModRegistry, REGISTRY_FILE, STATUS_INVALID
+
+SHARD_MANIFEST = "shard.json"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse "i/N" into (index, count), 0 <= index < count
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {spec!r}, expected i/N, e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {spec!r}, index must be in 0..{count - 1}")
+    return index, count
+
+
+def shard_of(mod_id: str, count: int) -> int:
+    """Shard of a mod id, independent of list order, host and Python hash seed"""
+    return int(hashlib.sha1(str(mod_id).encode("utf-8")).hexdigest(), 16) % count
+
+
+def select_mods(mod_ids: List[str], index: int, count: int) -> List[str]:
+    """Mods of one shard, in the order of mod_ids"""
+    return [mod_id for mod_id in mod_ids if shard_of(mod_id, count) == index]
+
+
+def write_shard_manifest(shard_dir: str, info: dict) -> str:
+    """Write shard.json atomically, returns its path"""
+    os.makedirs(shard_dir, exist_ok=True)
+    path = os.path.join(shard_dir, SHARD_MANIFEST)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_shards(shard_dirs: List[str]) -> List[dict]:
+    """
+    Load and validate the shard.json of every shard directory
+    All shards of one run must be present exactly once and agree on the shard count
+    """
+    shards = []
+    for shard_dir in shard_dirs:
+        with open(os.path.join(shard_dir, SHARD_MANIFEST), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        info["dir"] = shard_dir
+        shards.append(info)
+    if not shards:
+        raise ValueError("No shard directories given")
+
+    counts = {info["count"] for info in shards}
+    if len(counts) != 1:
+        raise ValueError(f"Shards disagree on the shard count: {sorted(counts)}")
+    count = counts.pop()
+    indexes = sorted(info["shard"] for info in shards)
+    if indexes != list(range(count)):
+        raise ValueError(f"Expected shards 0..{count - 1} exactly once, got {indexes}")
+    for info in shards:
+        foreign = [mod_id for mod_id in info["ids"] if shard_of(mod_id, count) != info["shard"]]
+        if foreign:
+            raise ValueError(f"Shard {info['shard']} contains mods of other shards: {foreign[:5]}")
+    return sorted(shards, key=lambda info: info["shard"])
+
+
+def merge_shards(shard_dirs: List[str], data_path: str, registry_path: str,
+                 changeset_path: Optional[str] = None, config_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Merge shard outputs into data_path and the mod registry at registry_path
+    Mods belong to exactly one shard, so data files never conflict; mods that
+    failed to load are marked invalid, new mods follow in sorted order
+    changeset_path: combine the shard changesets into this file, None skips them
+    config_path: seeds the registry from its id lists if there is no registry yet,
+    its blacklist_ids are applied to the registry on every merge
+    Returns the combined run statistics
+    """
+    logger = logging.getLogger("shard")
+    shards = load_shards(shard_dirs)
+    os.makedirs(data_path, exist_ok=True)
+
+    stats = {"shards": len(shards), "mods": 0, "valid": 0, "processed": 0, "errors": 0, "data_files": 0}
+    valid_ids = set()
+    updated_ids = set()
+    for info in shards:
+        shard_data = os.path.join(info["dir"], "data")
+        for mod_id in info["data_files"]:
+            file_name = f"{mod_id}.toml"
+            src = os.path.join(shard_data, file_name)
+            dst = os.path.join(data_path, file_name)
+            # Shard directories start empty, only a comparison with the canonical file tells an update
+            if not os.path.exists(dst) or not filecmp.cmp(src, dst, shallow=False):
+                updated_ids.add(mod_id)
+            tmp_path = f"{dst}.tmp"
+            shutil.copy2(src, tmp_path)
+            os.replace(tmp_path, dst)
+            stats["data_files"] += 1
+        valid_ids.update(info["valid_ids"])
+        for key in ("processed", "errors"):
+            stats[key] += info["stats"][key]
+        stats["mods"] += len(info["ids"])
+        logger.info(f"Merged shard {info['shard']}/{info['count']}: {len(info['data_files'])} data files, "
+                    f"{len(info['valid_ids'])}/{len(info['ids'])} valid mods")
+
+    registry = ModRegistry(registry_path)
+    if config_path and os.path.exists(config_path):
+        config = Config(config_path)
+        if not registry.exists:
+            registry.seed(config["workshop"]["ids"], config["workshop"].get("blacklist_ids", []))
+        # Shard runs never save the registry, so their blacklist changes are applied here
+        registry.sync_blacklist(config["workshop"].get("blacklist_ids", []))
+    for mod_id in sorted(valid_ids):
+        registry.add(mod_id)
+    for info in shards:
+        for mod_id in info["ids"]:
+            if mod_id not in valid_ids:
+                registry.set_status(mod_id, STATUS_INVALID)
+        for mod_id in info["data_files"]:
+            registry.mark_processed(mod_id, mod_id in updated_ids)
+    registry.save()
+    stats["valid"] = len(valid_ids)
+    if changeset_path:
+        changeset_files = [os.path.join(info["dir"], CHANGESET_FILE) for info in shards]
+        missing = [path for path in changeset_files if not os.path.exists(path)]
+        if missing:
+            logger.warning(f"Shards without a changeset: {missing}, merged changeset is incomplete")
+        merge_changesets([path for path in changeset_files if path not in missing]).write(changeset_path)
+    logger.info(f"Merged {stats['shards']} shards: {stats['valid']}/{stats['mods']} valid mods, "
+                f"{stats['processed']} processed, {stats['errors']} errors")
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge sharded main.py runs into git/data and the mod registry")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge_parser = subparsers.add_parser("merge", help="Merge shard directories")
+    merge_parser.add_argument("shard_dirs", nargs="+", help="Shard directories, each holding shard.json")
+    merge_parser.add_argument("--data", default=os.path.join("git", "data"), help="Canonical data directory")
+    merge_parser.add_argument("--registry", default=REGISTRY_FILE, help="Mod registry to update")
+    merge_parser.add_argument("--config", default="config.toml",
+                              help="Config file seeding the registry and providing blacklist_ids")
+    merge_parser.add_argument("--stats", default=None, help="Write the combined run statistics as JSON")
+    merge_parser.add_argument("--changeset", default=CHANGESET_FILE,
+                              help="Write the combined changeset here, empty to skip (default: changeset.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    stats = merge_shards(args.shard_dirs, args.data, args.registry, args.changeset or None, args.config)
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+    print(json.dumps(stats))
+
+
+if __name__ == '__main__':
+    main()
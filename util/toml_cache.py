@@ -0,0 +1,164 @@
+"""
+version: 1.0.1
+author: Wuyilingwei
+This module provides a disk cache of parsed TOML data files
+Parsed structures are pickled under a key made of the file path, size and
+mtime, so a repeat load costs one stat call plus unpickling; a changed file
+simply gets a new key. The cache directory is bounded in bytes and evicts the
+least recently used entries
+"""
+import os
+import pickle
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import toml
+from .metrics import get_metrics
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction frees the cache down to this fraction of max_bytes, so one scan makes room for many stores
+EVICT_LOW_WATER = 0.9
+
+
+class TomlCache:
+    """
+    Size-bounded LRU cache of parsed TOML files
+    Recency is the mtime of the cache entry, refreshed on every hit
+    """
+    cache_dir: str
+    max_bytes: int
+    hits: int
+    misses: int
+    total_bytes: Optional[int]
+    logger: logging.Logger
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, path: str, stat: os.stat_result) -> str:
+        key = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".pickle")
+
+    def load(self, path: str) -> OrderedDict:
+        """
+        Parsed content of a TOML file, same result as toml.load(f, _dict=OrderedDict)
+        Every call returns a fresh object, callers may modify it
+        """
+        stat = os.stat(path)
+        entry_path = self._entry_path(path, stat)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = pickle.load(f)
+            os.utime(entry_path)
+            self.hits += 1
+            return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Dropping unreadable cache entry for {path}: {e}")
+            self._remove(entry_path)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = toml.load(f, _dict=OrderedDict)
+        self.misses += 1
+        # Only cache what belongs to the fingerprint, the file may have changed while parsing
+        current = os.stat(path)
+        if (current.st_size, current.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            self._store(entry_path, data)
+        return data
+
+    def _store(self, entry_path: str, data: OrderedDict) -> None:
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            self.logger.warning(f"Failed to write cache entry {entry_path}: {e}")
+            self._remove(tmp_path)
+            return
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self._scan())
+        else:
+            self.total_bytes += len(payload)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def _remove(self, entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+    def _scan(self) -> List[Tuple[int, int, str]]:
+        """
+        (mtime_ns, size, path) of every cache entry
+        Several processes share the directory: their *.tmp files are skipped and
+        entries removed by them while scanning are ignored
+        """
+        entries = []
+        for e in os.scandir(self.cache_dir):
+            if not e.name.endswith(".pickle"):
+                continue
+            try:
+                stat = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, e.path))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache is below EVICT_LOW_WATER of max_bytes
+        Returns the number of entries removed
+        """
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * EVICT_LOW_WATER)
+        removed = 0
+        for _, size, entry_path in entries:
+            if total <= target:
+                break
+            total -= size
+            self._remove(entry_path)
+            removed += 1
+        self.total_bytes = total
+        if removed:
+            self.logger.debug(f"Evicted {removed} cache entries, {total} bytes left")
+        return removed
+
+
+_default_cache: Optional[TomlCache] = None
+
+
+def configure(cache_dir: Optional[str], max_bytes: int = DEFAULT_MAX_BYTES) -> Optional[TomlCache]:
+    """Set the cache used by load_toml, None disables caching"""
+    global _default_cache
+    _default_cache = TomlCache(cache_dir, max_bytes) if cache_dir else None
+    return _default_cache
+
+
+def get_cache() -> Optional[TomlCache]:
+    return _default_cache
+
+
+def load_toml(path: str) -> OrderedDict:
+    """Load a TOML file through the configured cache, or directly if there is none"""
+    metrics = get_metrics()
+    if metrics.enabled:
+        metrics.inc("files_read", kind="toml")
+        metrics.inc("bytes_read", os.path.getsize(path), kind="toml")
+    if _default_cache is not None:
+        return _default_cache.load(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return toml.load(f, _dict=OrderedDict)
@@ -1,15 +1,19 @@
 """
-version: 1.0.0
+version: 1.3.2
 author: Wuyilingwei
 This module provides class of translators
 Support OPENAI-STYLED LLM API Translator
 TODO: Google Translator
+deep_translator is only imported by TranslatorGoogle.translate
 """
+import re
 import time
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 import requests
-from deep_translator import GoogleTranslator
 
 
 class Translator:
@@ -24,13 +28,26 @@ class Translator:
     rate_limit_num: int
     rate_limit_seconds: int
     request_history: list[float]
+    limiter_wait: float
+    max_workers: int
     logger: logging.Logger
 
-    def __init__(self, min_length: int = 0, max_length: int = 1000, rate_limit: str = "10/s") -> None:
+    # Placeholders like {0} / {name} and markup tags like <color=#FF0000> are never split
+    PROTECTED_PATTERN = re.compile(r'\{[^{}]*\}|<[^<>]*>')
+    # Split after a line break, or after sentence punctuation followed by whitespace (or CJK punctuation)
+    BOUNDARY_PATTERN = re.compile(r'\n+|(?<=[.!?;])\s+|(?<=[。！？；])')
+    TAG_NAME_PATTERN = re.compile(r'</?\s*([A-Za-z][\w-]*)')
+    WHITESPACE_PATTERN = re.compile(r'\s+')
+
+    def __init__(self, min_length: int = 0, max_length: int = 1000, rate_limit: str = "10/s",
+                 max_workers: int = 4) -> None:
         self.min_length = min_length
         self.max_length = max_length
         self.rate_limit = rate_limit
+        self.max_workers = max_workers
         self.request_history = []
+        self.limiter_wait = 0.0
+        self._limiter_lock = threading.Lock()
         self.logger = logging.getLogger(self.__class__.__name__)
         self._parse_rate_limit()
 
@@ -55,17 +72,24 @@ class Translator:
 
     def _check_rate_limit(self) -> None:
         """
-        Check if the rate limit is exceeded
+        Check if the rate limit is exceeded and record the request
+        Thread-safe, time spent waiting is accumulated in limiter_wait, including
+        the time blocked on the lock while another thread sleeps
         """
         if not self.rate_limit_num:
             return
-        current_time = time.time()
-        self.request_history = [t for t in self.request_history if current_time - t < self.rate_limit_seconds]
-        if len(self.request_history) >= self.rate_limit_num:
-            sleep_time = self.rate_limit_seconds - (current_time - self.request_history[0])
-            self.logger.info(f"Rate limit exceeded, sleeping for {sleep_time} seconds")
-            time.sleep(sleep_time)
+        wait_start = time.perf_counter()
+        with self._limiter_lock:
+            current_time = time.time()
             self.request_history = [t for t in self.request_history if current_time - t < self.rate_limit_seconds]
+            if len(self.request_history) >= self.rate_limit_num:
+                sleep_time = self.rate_limit_seconds - (current_time - self.request_history[0])
+                self.logger.info(f"Rate limit exceeded, sleeping for {sleep_time} seconds")
+                time.sleep(sleep_time)
+                current_time = time.time()
+                self.request_history = [t for t in self.request_history if current_time - t < self.rate_limit_seconds]
+            self.request_history.append(current_time)
+            self.limiter_wait += time.perf_counter() - wait_start
 
     def translate(self, text: str, aim: str) -> dict:
         """
@@ -73,6 +97,120 @@ class Translator:
         """
         raise NotImplementedError
 
+    def split_text(self, text: str) -> list[str]:
+        """
+        Split text into segments of at most max_length characters
+        Splits on line or sentence boundaries outside placeholders and markup; only tags
+        with a matching closing tag span their content, void tags like <br> or <sprite=...>
+        do not. A segment still longer than max_length is split at whitespace, inside a
+        tag pair if necessary but never inside a single tag or placeholder
+        "".join(segments) == text
+        """
+        if len(text) <= self.max_length:
+            return [text]
+
+        # token: positions inside a single placeholder or tag
+        # blocked: token positions plus everything between an opening tag and its closing tag
+        token = set()
+        opened = []
+        pairs = []
+        for match in self.PROTECTED_PATTERN.finditer(text):
+            token.update(range(match.start() + 1, match.end()))
+            name = self.TAG_NAME_PATTERN.match(match.group())
+            if not name:
+                continue
+            if match.group().startswith('</'):
+                # Pair with the nearest open tag of the same name, tags left open in between are void
+                for i in range(len(opened) - 1, -1, -1):
+                    if opened[i][0] == name.group(1):
+                        pairs.append((opened[i][1], match.end()))
+                        del opened[i:]
+                        break
+            elif not match.group().endswith('/>'):
+                opened.append((name.group(1), match.start()))
+        blocked = set(token)
+        for open_start, close_end in pairs:
+            blocked.update(range(open_start + 1, close_end))
+
+        pieces = []
+        start = 0
+        for match in self.BOUNDARY_PATTERN.finditer(text):
+            end = match.end()
+            if end <= start or end >= len(text) or end in blocked:
+                continue
+            pieces.append(text[start:end])
+            start = end
+        pieces.append(text[start:])
+
+        segments = []
+        current = ""
+        for piece in pieces:
+            if current and len(current) + len(piece) > self.max_length:
+                segments.append(current)
+                current = ""
+            current += piece
+        if current:
+            segments.append(current)
+
+        result = []
+        offset = 0
+        for segment in segments:
+            if len(segment) > self.max_length:
+                result.extend(self._split_at_whitespace(text, offset, offset + len(segment), blocked, token))
+            else:
+                result.append(segment)
+            offset += len(segment)
+        return result
+
+    def _split_at_whitespace(self, text: str, start: int, end: int, blocked: set, token: set) -> list[str]:
+        """
+        Hard fallback of split_text for text[start:end]: cut after whitespace as close
+        to max_length as possible, preferring cuts outside tag pairs
+        """
+        cuts = [match.end() for match in self.WHITESPACE_PATTERN.finditer(text, start, end)
+                if start < match.end() < end and match.end() not in token]
+        segments = []
+        while end - start > self.max_length:
+            candidates = [cut for cut in cuts if cut > start]
+            fitting = [cut for cut in candidates if cut - start <= self.max_length]
+            # A cut outside tag pairs wins unless it leaves a segment under half of max_length
+            preferred = [cut for cut in fitting if cut not in blocked and cut - start >= self.max_length // 2]
+            cut = preferred[-1] if preferred else fitting[-1] if fitting else None
+            if cut is None:
+                if not candidates:
+                    break
+                # No whitespace within max_length, cut as early as possible
+                cut = candidates[0]
+            segments.append(text[start:cut])
+            start = cut
+        segments.append(text[start:end])
+        return segments
+
+    def _translate_segments(self, text: str, aim: str, translate_one: Callable[[str, str], dict]) -> dict:
+        """
+        Translate a long text segment by segment in parallel and reassemble it in order
+        Whitespace around each segment is kept from the source
+        """
+        segments = self.split_text(text)
+        self.logger.info(f"Split text of {len(text)} characters into {len(segments)} segments")
+
+        def translate_segment(segment: str) -> dict:
+            core = segment.strip()
+            if not core:
+                return {"text": segment, "code": 200}
+            result = translate_one(core, aim)
+            if result["code"] != 200:
+                return result
+            start = segment.find(core)
+            return {"text": segment[:start] + result["text"] + segment[start + len(core):], "code": 200}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            results = list(pool.map(translate_segment, segments))
+        for result in results:
+            if result["code"] != 200:
+                return result
+        return {"text": "".join(result["text"] for result in results), "code": 200}
+
     def get_price(self) -> float:
         """
         Calculate the usage cost of the translator
@@ -92,7 +230,6 @@ class TranslatorGoogle(Translator):
     def translate(self, text: str, aim: str) -> dict:
         self.logger.info(f"Translating text: {text}")
         self._check_rate_limit()
-        self.request_history.append(time.time())
         if text == "":
             self.logger.warning("Empty text")
             return {"text": "", "code": -1}
@@ -100,6 +237,7 @@ class TranslatorGoogle(Translator):
             self.logger.warning("Text too short")
             return {"text": text, "code": -1}
         try:
+            from deep_translator import GoogleTranslator
             GoogleTranslator(source='auto', target=aim).translate(text)
             self.logger.info(f"Translated text: {text}")
             return {"text": text, "code": 200}
@@ -144,7 +282,7 @@ class TranslatorLLM(Translator):
     llm_data: dict
 
     def __init__(self, min_length: int = 3, max_length: int = 1000, rate_limit: str = "10/s",
-                 llm_info: dict = None) -> None:
+                 llm_info: dict = None, max_workers: int = 4) -> None:
         if llm_info is None:
             llm_info = {}
         self.llm_data = {
@@ -158,20 +296,50 @@ class TranslatorLLM(Translator):
             "input_token": 0,
             "output_token": 0
         }
-        super().__init__(min_length, max_length, rate_limit)
+        # Not _limiter_lock: _check_rate_limit sleeps while holding it
+        self._usage_lock = threading.Lock()
+        # Reuse connections across requests
+        self.session = requests.Session()
+        super().__init__(min_length, max_length, rate_limit, max_workers)
 
     def translate(self, text: str, aim: str) -> dict:
-        if self.llm_data["token"] == "":
-            raise ValueError("API token is required")
-        self._check_rate_limit()
-        self.request_history.append(time.time())
+        # Short texts never reach the network or the rate limiter
         if text == "":
             self.logger.warning("Empty text")
             return {"text": "", "code": -1}
         elif len(text) < self.min_length:
             self.logger.warning("Text too short")
             return {"text": text, "code": -1}
+        if self.llm_data["token"] == "":
+            raise ValueError("API token is required")
+        if len(text) > self.max_length:
+            return self._translate_segments(text, aim, self._translate_single)
+        return self._translate_single(text, aim)
 
+    def _translate_single(self, text: str, aim: str) -> dict:
+        """
+        Translate one text with a single request
+        """
+        self._check_rate_limit()
+        result = self._post_messages([
+            {
+                "role": "system",
+                "content": self.llm_data["prompt"].replace("{language}", aim)
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ])
+        if result["code"] == 200:
+            self.logger.info(f'{text} -> {result["text"]}')
+        return result
+
+    def _post_messages(self, messages: list[dict]) -> dict:
+        """
+        Send chat messages to the API and account token usage
+        The caller is responsible for the rate limit check
+        """
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.llm_data['token']}"
@@ -179,32 +347,25 @@ class TranslatorLLM(Translator):
 
         data = {
             "model": self.llm_data["model"],
-            "messages": [
-                {
-                    "role": "system",
-                    "content": self.llm_data["prompt"].replace("{language}", aim)
-                },
-                {
-                    "role": "user",
-                    "content": text
-                }
-            ]
+            "messages": messages
         }
 
         try:
             self.logger.debug(headers)
             self.logger.debug(data)
-            response = requests.post(self.llm_data["api"], headers=headers, data=json.dumps(data))
+            response = self.session.post(self.llm_data["api"], headers=headers, data=json.dumps(data))
             response_data = response.json()
             if 'usage' in response_data:
                 self.logger.debug(f"Prompt tokens: {response_data['usage']['prompt_tokens']},"
                                   f"Completion tokens: {response_data['usage']['completion_tokens']}")
+                with self._usage_lock:
+                    self.llm_data["input_token"] += response_data['usage']['prompt_tokens']
+                    self.llm_data["output_token"] += response_data['usage']['completion_tokens']
             else:
                 self.logger.warning('No usage data found')
 
             if response.status_code == 200:
                 openai_result = response_data['choices'][0]['message']['content']
-                self.logger.info(f'{text} -> {openai_result}')
                 return {"text": openai_result, "code": response.status_code}
             else:
                 self.logger.error(f"Request failed, status code: {response.status_code}")
@@ -290,3 +451,13 @@ class TranslatorLLM(Translator):
         except Exception as e:
             self.logger.error(f"LLM API call failed: {e}")
             raise
+
+    def _make_llm_request(self, prompt: str) -> dict:
+        """发送单条提示词到LLM API，失败时抛出异常以便降级"""
+        if self.llm_data["token"] == "":
+            raise ValueError("API token is required")
+        self._check_rate_limit()
+        result = self._post_messages([{"role": "user", "content": prompt}])
+        if result["code"] != 200:
+            raise RuntimeError(f"LLM request failed with code {result['code']}")
+        return result
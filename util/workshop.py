@@ -1,11 +1,11 @@
 """
-version: 1.0.0
+version: 1.1.0
 author: Wuyilingwei
 Get the latest mods from the Steam Workshop
+requests and BeautifulSoup are imported on first use, runs that skip the
+workshop fetch never load them
 """
 import logging
-import requests
-from bs4 import BeautifulSoup
 
 
 class WorkshopNewMods:
@@ -38,6 +38,9 @@ class WorkshopNewMods:
         Returns a list of the latest mods from the Steam Workshop
         depth: the number of pages to search for mods
         """
+        import requests
+        from bs4 import BeautifulSoup
+
         def response_to_ids(response: requests.Response) -> None:
             soup = BeautifulSoup(response.content, 'html.parser')
             mod_elements = soup.find_all('a', {'class': 'ugc'})